@@ -0,0 +1 @@
+"""Benchmarks of the APSchool API client."""
@@ -0,0 +1,196 @@
+"""Benchmark ApschoolApiClient.async_get_user_data against the mock API
+
+Usage: scripts/benchmark [--children 4] [--messages 500] [--iterations 5] ...
+
+The API client is imported as the top-level "api" package (scripts/benchmark
+puts custom_components/apschool on the PYTHONPATH), so Home Assistant does not
+need to be installed.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+import aiohttp
+
+from api.apschool import (
+    ApschoolApiClient,
+    ApschoolApiClientError,
+)
+from api.resilience import (
+    RequestBudget,
+    RetryPolicy,
+    TokenBucket,
+)
+
+from .mock_server import MockApschoolServer
+
+# Rate and budget that never limit the client
+UNLIMITED = 10**9
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="scripts/benchmark", description=__doc__)
+    parser.add_argument("--children", type=int, default=3, help="number of linked children")
+    parser.add_argument("--messages", type=int, default=200, help="messages per mailbox")
+    parser.add_argument("--unread-ratio", type=float, default=0.1, help="share of unread messages")
+    parser.add_argument("--latency", type=float, default=0.05, help="latency of a response (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- random latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 responses")
+    parser.add_argument("--concurrency", type=int, default=4, help="client max_concurrency")
+    parser.add_argument(
+        "--rate", type=float, default=0.0, help="client rate limit (requests/s, 0: unlimited)"
+    )
+    parser.add_argument("--burst", type=int, default=10, help="client rate limit burst")
+    parser.add_argument("--iterations", type=int, default=5, help="measured refreshes")
+    parser.add_argument(
+        "--cold", action="store_true", help="use a new client (no token/message cache) for every refresh"
+    )
+    parser.add_argument(
+        "--no-etags", action="store_true", help="the mock sends no ETag (no 304 responses)"
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=0.0,
+        help="reuse of the responses without ETag (s), 0 so that every refresh asks the mock",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the mock randomness")
+    parser.add_argument("--json", action="store_true", help="output the results as JSON")
+    return parser.parse_args(argv)
+
+
+async def _async_run(args: argparse.Namespace) -> dict:
+    server = MockApschoolServer(
+        children=args.children,
+        messages=args.messages,
+        unread_ratio=args.unread_ratio,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        etags=not args.no_etags,
+    )
+    base_url = await server.start()
+
+    runs = []
+    try:
+        async with aiohttp.ClientSession() as session:
+
+            def new_client() -> ApschoolApiClient:
+                client = ApschoolApiClient(
+                    username="benchmark",
+                    password="benchmark",
+                    base_url=base_url,
+                    session=session,
+                    max_concurrency=args.concurrency,
+                    # Keep the retries but not the real-life backoff delays
+                    retry_policy=RetryPolicy(backoff_factor=0.01),
+                    rate_limiter=(
+                        TokenBucket(rate=args.rate, capacity=args.burst)
+                        if args.rate > 0
+                        else TokenBucket(rate=UNLIMITED, capacity=UNLIMITED)
+                    ),
+                    budget=RequestBudget(daily_limit=UNLIMITED),
+                )
+                client.response_cache.ttl = args.cache_ttl
+                return client
+
+            client = new_client()
+            for _ in range(args.iterations):
+                if args.cold:
+                    client = new_client()
+                server.reset_counters()
+
+                tracemalloc.start()
+                started = time.perf_counter()
+                error = None
+                try:
+                    await client.async_get_user_data()
+                except ApschoolApiClientError as exception:
+                    # e.g. a 503 on the authentication, which is never retried
+                    error = str(exception)
+                wall_time = time.perf_counter() - started
+                snapshot = tracemalloc.take_snapshot()
+                _, peak_memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                runs.append(
+                    {
+                        "wall_time": wall_time,
+                        "requests": server.total_requests,
+                        "requests_by_endpoint": dict(server.requests),
+                        "response_bytes": server.response_bytes,
+                        # Blocks allocated during the refresh and still alive at its end
+                        # (tracemalloc does not count the blocks already freed)
+                        "retained_blocks": sum(
+                            stat.count for stat in snapshot.statistics("filename")
+                        ),
+                        "peak_memory": peak_memory,
+                        "error": error,
+                    }
+                )
+    finally:
+        await server.stop()
+
+    def summary(key: str) -> dict:
+        values = [run[key] for run in runs]
+        return {
+            "min": min(values),
+            "median": statistics.median(values),
+            "max": max(values),
+        }
+
+    return {
+        "parameters": vars(args),
+        "first": runs[0],
+        "failed_refreshes": sum(1 for run in runs if run["error"] is not None),
+        "wall_time": summary("wall_time"),
+        "requests": summary("requests"),
+        "response_bytes": summary("response_bytes"),
+        "retained_blocks": summary("retained_blocks"),
+        "peak_memory": summary("peak_memory"),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmark and print the results"""
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    if args.iterations < 1:
+        args.iterations = 1
+    results = asyncio.run(_async_run(args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))  # noqa: T201
+        return 0
+
+    print(  # noqa: T201
+        f"{args.children} children, {args.messages} messages each, "
+        f"{args.latency * 1000:.0f} ms latency, {args.error_rate:.0%} errors, "
+        f"{args.iterations} {'cold' if args.cold else 'warm'} refreshes"
+    )
+    print(f"first refresh: {results['first']['wall_time'] * 1000:.1f} ms, {results['first']['requests']} requests")  # noqa: T201
+    if results["failed_refreshes"]:
+        print(f"failed refreshes: {results['failed_refreshes']} of {args.iterations}")  # noqa: T201
+    for key, unit, scale, decimals in (
+        ("wall_time", " ms", 1000, 1),
+        ("requests", "", 1, 0),
+        ("response_bytes", " B", 1, 0),
+        ("retained_blocks", "", 1, 0),
+        ("peak_memory", " B", 1, 0),
+    ):
+        values = results[key]
+        print(  # noqa: T201
+            f"{key:>15}: min {values['min'] * scale:,.{decimals}f}{unit}"
+            f"  median {values['median'] * scale:,.{decimals}f}{unit}"
+            f"  max {values['max'] * scale:,.{decimals}f}{unit}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
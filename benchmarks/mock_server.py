@@ -0,0 +1,197 @@
+"""In-process mock of the APSchool API, used by the benchmarks
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+def make_token(subject: str, lifetime: int = 3600) -> str:
+    """Build an (unsigned) JWT with a subject and an expiry"""
+
+    def encode(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+    claims = {"sub": subject, "exp": int(time.time()) + lifetime}
+    return f"{encode({'alg': 'none'})}.{encode(claims)}.signature"
+
+
+class MockApschoolServer:
+    """MockApschoolServer class
+
+    Serves `authentification`, `liaisons`, `/session`, `/comptes` and
+    `/messages` for a configurable number of children and mailbox size, with
+    a configurable latency and error rate. The GET responses carry an ETag and
+    are answered with a 304 when it matches (unless `etags` is False).
+    """
+
+    def __init__(
+        self,
+        children: int = 3,
+        messages: int = 100,
+        unread_ratio: float = 0.1,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        etags: bool = True,
+    ) -> None:
+        self.children = children
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.etags = etags
+        self.requests: dict[str, int] = {}
+        self.response_bytes = 0
+        self._random = random.Random(seed)
+        self._runner: web.AppRunner | None = None
+        self.base_url: str | None = None
+
+        self.user_ids = [100000 + index for index in range(children)]
+        # Balance of the main account of each child
+        self.balances = {user_id: 23.86 for user_id in self.user_ids}
+        self.mailboxes = {
+            user_id: [
+                {
+                    "id": 2000000 + user_id * 10 + messages - index,
+                    "titre": f"Message {messages - index}",
+                    "ouvert": self._random.random() >= unread_ratio,
+                    "archive": False,
+                    "typeMessage": 4,
+                    "pieceJointes": False,
+                    "dateCreation": time.strftime(
+                        "%Y-%m-%dT%H:%M:%S",
+                        time.gmtime(1700000000 + (messages - index) * 3600),
+                    ),
+                }
+                for index in range(messages)
+            ]
+            for user_id in self.user_ids
+        }
+
+    @property
+    def total_requests(self) -> int:
+        """Number of requests served"""
+        return sum(self.requests.values())
+
+    def reset_counters(self) -> None:
+        """Reset the request and byte counters"""
+        self.requests = {}
+        self.response_bytes = 0
+
+    async def start(self) -> str:
+        """Start the server on a free local port
+
+        Returns:
+            str: the base URL of the server
+        """
+        app = web.Application()
+        app.router.add_post("/authentification", self._authenticate)
+        app.router.add_post(
+            "/authentification/{from_id}/liaisons/{to_id}", self._change_link
+        )
+        app.router.add_get("/session", self._session)
+        app.router.add_get("/mediatr-utilisateurs/{user_id}/comptes", self._accounts)
+        app.router.add_get("/utilisateurs/{user_id}/messages", self._messages)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # pylint: disable=protected-access
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        """Stop the server"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _respond(
+        self, name: str, payload: dict, request: web.Request | None = None
+    ) -> web.Response:
+        self.requests[name] = self.requests.get(name, 0) + 1
+        await asyncio.sleep(
+            max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        )
+        if self._random.random() < self.error_rate:
+            return web.json_response({"message": "mock error"}, status=503)
+        body = json.dumps(payload)
+        headers = {}
+        if self.etags and request is not None and request.method == "GET":
+            etag = f'"{hashlib.blake2b(body.encode(), digest_size=8).hexdigest()}"'
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers={"ETag": etag})
+            headers["ETag"] = etag
+        self.response_bytes += len(body)
+        return web.Response(text=body, content_type="application/json", headers=headers)
+
+    def _user_id(self, request: web.Request) -> int:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            return int(json.loads(base64.urlsafe_b64decode(payload))["sub"])
+        except (IndexError, KeyError, ValueError):
+            return 0
+
+    async def _authenticate(self, request: web.Request) -> web.Response:
+        return await self._respond(
+            "authentification",
+            {
+                "token": make_token("0"),
+                "liaisons": [
+                    {"utilisateurId": user_id, "identifiantCible": user_id + 1}
+                    for user_id in self.user_ids
+                ],
+            },
+        )
+
+    async def _change_link(self, request: web.Request) -> web.Response:
+        return await self._respond(
+            "liaisons", {"token": make_token(request.match_info["from_id"])}
+        )
+
+    async def _session(self, request: web.Request) -> web.Response:
+        user_id = self._user_id(request)
+        return await self._respond(
+            "session",
+            {
+                "id": user_id,
+                "prenom": f"Child {user_id}",
+                "nom": "Doe",
+                "classe": {"id": 12861, "libelle": "C12345"},
+            },
+            request,
+        )
+
+    async def _accounts(self, request: web.Request) -> web.Response:
+        balance = self.balances.get(self._user_id(request), 23.86)
+        return await self._respond(
+            "comptes",
+            {
+                "items": [
+                    {"id": 1, "solde": balance, "typeCompte": 0, "totalAPayer": 12.5},
+                    {"id": 2, "solde": 0.0, "typeCompte": 1, "totalAPayer": 3.0},
+                ],
+                "totalItems": 2,
+            },
+            request,
+        )
+
+    async def _messages(self, request: web.Request) -> web.Response:
+        mailbox = self.mailboxes.get(int(request.match_info["user_id"]), [])
+        items = mailbox
+        if "page" in request.query and "taille" in request.query:
+            size = int(request.query["taille"])
+            start = (int(request.query["page"]) - 1) * size
+            items = mailbox[start:start + size]
+        return await self._respond(
+            "messages", {"items": items, "totalItems": len(mailbox)}, request
+        )
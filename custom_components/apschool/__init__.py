@@ -4,15 +4,26 @@
 from __future__ import annotations
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_PASSWORD, CONF_USERNAME, Platform
+from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
-
-from .api.apschool import ApschoolApiClient
-from .const import DOMAIN, LOGGER
-from .coordinator import ApschoolDataUpdateCoordinator
+from homeassistant.helpers.storage import Store
+
+from .const import DATA_HISTORY, DOMAIN, LOGGER
+from .coordinator import (
+    STORAGE_VERSION,
+    ApschoolDataUpdateCoordinator,
+    async_forget_history,
+)
+from .history import HISTORY_FILE, AccountHistory
+from .hub import (
+    async_acquire_client,
+    async_apply_client_options,
+    async_release_client,
+)
+from .services import async_setup_services
 
 PLATFORMS: list[Platform] = [
+    Platform.EVENT,
     Platform.SENSOR,
 ]
 
@@ -22,29 +33,43 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up apschool from a config entry."""
     LOGGER.debug("Integration async setup entry: %s", entry.as_dict())
     hass.data.setdefault(DOMAIN, {})
+    if DATA_HISTORY not in hass.data:
+        hass.data[DATA_HISTORY] = AccountHistory(hass.config.path(HISTORY_FILE))
 
     hass.data[DOMAIN][entry.entry_id] = coordinator = ApschoolDataUpdateCoordinator(
         hass=hass,
-        client=ApschoolApiClient(
-            base_url=entry.data["base_url"],
-            username=entry.data[CONF_USERNAME],
-            password=entry.data[CONF_PASSWORD],
-            session=async_get_clientsession(hass),
-        ),
+        # The entries of the same account share a client and its connections
+        client=async_acquire_client(hass, entry),
         config_entry=entry,
+        history=hass.data[DATA_HISTORY],
     )
-    # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
-    await coordinator.async_config_entry_first_refresh()
+    # Start from the last snapshot when there is one, so the setup does not wait for the API
+    restored = await coordinator.async_restore_snapshot()
+    if not restored:
+        # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
+        try:
+            await coordinator.async_config_entry_first_refresh()
+        except Exception:
+            hass.data[DOMAIN].pop(entry.entry_id)
+            await async_release_client(hass, entry)
+            raise
 
     # https://developers.home-assistant.io/blog/2024/06/12/async_forward_entry_setups
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    if restored:
+        entry.async_create_background_task(
+            hass, coordinator.async_refresh(), f"{DOMAIN} refresh {entry.entry_id}"
+        )
+
     # for platform in PLATFORMS:
     #     hass.async_create_task(
     #         hass.config_entries.async_forward_entry_setup(entry, platform)
     #     )
 
-    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+    async_setup_services(hass)
+
+    entry.async_on_unload(entry.add_update_listener(async_update_listener))
 
     return True
 
@@ -56,23 +81,51 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     If you have created any custom services, they need to be removed here too.
     """
 
-    # Unload services
-    for service in hass.services.async_services_for_domain(DOMAIN):
-        hass.services.async_remove(DOMAIN, service)
-
     # Unload platforms
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
 
     # Remove the config entry from the hass data object.
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
+        await async_release_client(hass, entry)
+
+    # Unload services and the history, they are shared by all the entries
+    if not hass.data[DOMAIN]:
+        for service in hass.services.async_services_for_domain(DOMAIN):
+            hass.services.async_remove(DOMAIN, service)
+        if (history := hass.data.pop(DATA_HISTORY, None)) is not None:
+            await hass.async_add_executor_job(history.close)
 
     # Return that unloading was successful.
     return unload_ok
 
 
-async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
-    """Reload config entry."""
-    # await async_unload_entry(hass, entry)
-    # await async_setup_entry(hass, entry)
-    await hass.config_entries.async_reload(entry.entry_id)
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the data stored for a config entry.
+
+    The children of the entry are read from its snapshot, their accounts
+    history is deleted with it.
+    """
+    store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+    stored = await store.async_load() or {}
+    user_ids = {user["user_id"] for user in stored.get("users") or ()}
+    await async_forget_history(hass, user_ids, entry.entry_id)
+    await store.async_remove()
+
+
+async def async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply the new options in place, reload the entry only when its data changed.
+
+    The data holds the credentials and the base_url, the options only tune
+    the polling and the requests.
+    """
+    coordinator: ApschoolDataUpdateCoordinator | None = hass.data[DOMAIN].get(
+        entry.entry_id
+    )
+    if coordinator is None or dict(entry.data) != coordinator.entry_data:
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+
+    LOGGER.debug("Applying the options of %s: %s", entry.entry_id, entry.options)
+    async_apply_client_options(coordinator.client, entry)
+    await coordinator.async_apply_options(entry.options)
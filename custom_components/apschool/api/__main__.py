@@ -0,0 +1,144 @@
+"""Poll many APSchool accounts and output their data as JSON lines
+
+Usage: scripts/poll credentials.json [--accounts 8] ...
+
+The api package does not depend on Home Assistant: scripts/poll runs it as a
+top-level package, without importing the integration.
+
+The credentials file is a JSON list of {"username", "password"} objects, each
+one may also have a "base_url". Each account is written as soon as it is
+fetched, one line per child:
+    {"account": "<username>", "user": {<UserData.to_dict()>}}
+and one line per account that failed:
+    {"account": "<username>", "error": "<message>"}
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from typing import Any, TextIO
+
+import aiohttp
+
+from .apschool import (
+    DEFAULT_MAX_CONCURRENCY,
+    ApschoolApiClient,
+    ApschoolApiClientError,
+)
+from .helpers import UserData
+
+DEFAULT_BASE_URL = "https://api.plateforme.apschool.be"
+# Accounts fetched at the same time
+DEFAULT_ACCOUNTS_CONCURRENCY = 8
+# Connections of the shared pool (all the accounts)
+DEFAULT_CONNECTIONS = 32
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="scripts/poll",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("credentials", help="JSON file of the credentials ('-' for stdin)")
+    parser.add_argument(
+        "--accounts",
+        type=int,
+        default=DEFAULT_ACCOUNTS_CONCURRENCY,
+        help="number of accounts fetched at the same time",
+    )
+    parser.add_argument(
+        "--children",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help="number of children of an account fetched at the same time",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help="size of the connection pool shared by all the accounts",
+    )
+    parser.add_argument(
+        "--base-url", default=DEFAULT_BASE_URL, help="API of the accounts without base_url"
+    )
+    parser.add_argument("--output", default="-", help="output file ('-' for stdout)")
+    return parser.parse_args(argv)
+
+
+def _load_credentials(path: str) -> list[dict[str, Any]]:
+    """Read the list of credentials"""
+    if path == "-":
+        credentials = json.load(sys.stdin)
+    else:
+        with open(path, encoding="utf-8") as file:
+            credentials = json.load(file)
+    if not isinstance(credentials, list) or not all(
+        isinstance(item, dict) and "username" in item and "password" in item
+        for item in credentials
+    ):
+        raise ValueError("The credentials must be a list of {username, password} objects")
+    return credentials
+
+
+async def _async_fetch_account(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    credentials: dict[str, Any],
+    args: argparse.Namespace,
+) -> tuple[str, list[UserData] | ApschoolApiClientError]:
+    """Fetch all the children of an account"""
+    async with semaphore:
+        client = ApschoolApiClient(
+            username=credentials["username"],
+            password=credentials["password"],
+            base_url=credentials.get("base_url") or args.base_url,
+            session=session,
+            max_concurrency=args.children,
+        )
+        try:
+            return credentials["username"], await client.async_get_user_data()
+        except ApschoolApiClientError as exception:
+            return credentials["username"], exception
+
+
+def _write(output: TextIO, line: dict) -> None:
+    output.write(json.dumps(line, separators=(",", ":")) + "\n")
+    output.flush()
+
+
+async def _async_run(args: argparse.Namespace, output: TextIO) -> int:
+    credentials = _load_credentials(args.credentials)
+    semaphore = asyncio.Semaphore(max(1, args.accounts))
+    connector = aiohttp.TCPConnector(limit=max(1, args.connections))
+    failures = 0
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = [
+            asyncio.ensure_future(_async_fetch_account(session, semaphore, item, args))
+            for item in credentials
+        ]
+        for task in asyncio.as_completed(tasks):
+            username, result = await task
+            if isinstance(result, ApschoolApiClientError):
+                failures += 1
+                _write(output, {"account": username, "error": str(result)})
+                continue
+            for user in result:
+                _write(output, {"account": username, "user": user.to_dict()})
+
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Poll the accounts and write their data"""
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    if args.output == "-":
+        return asyncio.run(_async_run(args, sys.stdout))
+    with open(args.output, "w", encoding="utf-8") as output:
+        return asyncio.run(_async_run(args, output))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
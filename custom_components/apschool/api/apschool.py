@@ -3,18 +3,39 @@
 # from __future__ import annotations
 
 import asyncio
+import json
 import logging
 import socket
+import time
+from collections.abc import Awaitable, Callable, Collection
 from typing import Any
 from urllib.parse import urljoin
 
 import aiohttp
-import async_timeout
 
-from custom_components.apschool.api.helpers import UnreadMessage, UserData
+from .cache import CachedResponse, ResponseCache
+from .helpers import (
+    ALL_DATA,
+    DATA_ACCOUNTS,
+    DATA_MESSAGES,
+    DATA_PROFILE,
+    Accounts,
+    LinkContext,
+    MessageIndex,
+    UserData,
+)
+from .metrics import ApiMetrics, endpoint_name
+from .resilience import (
+    CircuitBreaker,
+    RequestBudget,
+    RetryPolicy,
+    TokenBucket,
+    parse_retry_after,
+)
+from .streaming import StreamedItems
+from .tokens import ACCOUNT_TOKEN_KEY, TokenStore
 
 _LOGGER = logging.getLogger(__name__)
-_LOGGER.setLevel(logging.DEBUG)
 
 
 class ApschoolApiClientError(Exception):
@@ -25,10 +46,41 @@ class ApschoolApiClientCommunicationError(ApschoolApiClientError):
     """Exception to indicate a communication error."""
 
 
+class ApschoolApiClientTransientError(ApschoolApiClientCommunicationError):
+    """Exception to indicate a communication error that may go away on retry."""
+
+    def __init__(self, *args, retry_after: float | None = None) -> None:
+        super().__init__(*args)
+        self.retry_after = retry_after
+
+
+class ApschoolApiClientCircuitOpenError(ApschoolApiClientCommunicationError):
+    """Exception to indicate that the API is not called after repeated failures."""
+
+
+class ApschoolApiClientBudgetExceededError(ApschoolApiClientCommunicationError):
+    """Exception to indicate that the daily request budget is spent."""
+
+
 class ApschoolApiClientAuthenticationError(ApschoolApiClientError):
     """Exception to indicate an authentication error."""
 
 
+class ApschoolApiClientTokenExpiredError(ApschoolApiClientAuthenticationError):
+    """Exception to indicate that the bearer token was refused (HTTP 401)."""
+
+
+DEFAULT_MAX_CONCURRENCY = 4
+# Methods that are safe to retry
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+# Number of messages requested per page
+MESSAGES_PAGE_SIZE = 100
+# Fields of the messages that are kept when parsing the mailbox
+MESSAGES_FIELDS = ("id", "titre", "dateCreation", "ouvert")
+# Every that many syncs, the whole mailbox is downloaded again
+MESSAGES_FULL_SYNC_EVERY = 24
+
+
 class ApschoolApiClient:
     """APSchool API Client."""
 
@@ -38,29 +90,58 @@ class ApschoolApiClient:
         password: str,
         base_url: str,
         session: aiohttp.ClientSession,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        retry_policy: RetryPolicy | None = None,
+        rate_limiter: TokenBucket | None = None,
+        budget: RequestBudget | None = None,
     ) -> None:
-        """API Client."""
+        """API Client.
+
+        The rate limiter and the budget can be given to share them with other
+        clients (or previous ones) of the same account.
+        """
         self._username = username
         self._password = password
         self._base_url = base_url
         self._session = session
+        self.max_concurrency = max_concurrency
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Circuit breaker of each endpoint (see endpoint_name)
+        self.circuit_breakers: dict[str, CircuitBreaker] = {}
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.budget = budget or RequestBudget()
+        self.response_cache = ResponseCache()
+        self.metrics = ApiMetrics()
         self.token = None
-        self.current_user_id = None
-
-    def _set_headers(self) -> dict:
+        self._tokens = TokenStore()
+        self._links: list[Any] | None = None
+        self._auth_lock = asyncio.Lock()
+        self._message_indexes: dict[int, MessageIndex] = {}
+        # Last accounts fetched, by user id (their items are kept in the history)
+        self.accounts: dict[int, Accounts] = {}
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+
+    def _set_headers(self, token: str | None = None) -> dict:
         """Set the request headers with authenrization
 
+        Args:
+            token: the bearer token to use, none for the authentication itself
+
         Returns:
             dict: the key-value pairs for the different headers
         """
 
         headers = {"Content-Type": "application/json"}
-        if self.token:
-            headers["Authorization"] = f"Bearer {self.token}"
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
         return headers
 
     async def _async_authenticate(self) -> list[Any]:
-        """Authenticate against the API and store the bearer token and the user_id"""
+        """Authenticate against the API and store the bearer token and the user_id
+
+        The previous account token stays in `self.token` until the new one is
+        received, the requests in flight keep using the one they were given.
+        """
         url = urljoin(self._base_url, "authentification")
         data = {
             "identite": self._username,
@@ -71,121 +152,454 @@ class ApschoolApiClient:
             method="POST", url=url, data=data, headers=self._set_headers()
         )
 
-        self.token = json_response.get("token")
+        token = json_response.get("token")
+        self._tokens.set(ACCOUNT_TOKEN_KEY, token)
+        self.token = token
         # self.user_id = json_response.get("liaisons")[0].get("utilisateurId")
         return json_response.get("liaisons")
 
-    async def _async_change_link(self, from_id: int, to_id: int):
-        """Change link is a method that set a new token for the "to_id",
-            meaning that any request with that token will be dedicated to that ID"""
+    async def _async_get_account_token(self) -> str:
+        """Get the account token, authenticating only when the cached one expired
+
+        The links are refreshed along with the account token.
+        """
+        async with self._auth_lock:
+            token = self._tokens.get(ACCOUNT_TOKEN_KEY)
+            if token is None or self._links is None:
+                self._links = await self._async_authenticate()
+                token = self.token
+            return token
+
+    async def async_validate_credentials(self) -> None:
+        """Check the credentials by authenticating, without fetching any data
+
+        The account token and the links are kept, so a later fetch does not
+        authenticate again.
+        """
+        async with self._auth_lock:
+            self._links = await self._async_authenticate()
+
+    def update_credentials(self, password: str) -> None:
+        """Use another password, the cached tokens are dropped"""
+        if password == self._password:
+            return
+        self._password = password
+        self._tokens.invalidate()
+        self.response_cache.invalidate()
+        self._links = None
+        self.token = None
+
+    def has_password(self, password: str) -> bool:
+        """Tell whether the client authenticates with this password"""
+        return password == self._password
+
+    async def _async_get_links(self) -> list[Any]:
+        """Get the links of the account (cached as long as the account token is valid)"""
+        await self._async_get_account_token()
+        return self._links
+
+    async def _async_ensure_link_token(
+        self, context: LinkContext, force: bool = False
+    ) -> str:
+        """Give the context a valid token, reusing the cached one when possible
+
+        Args:
+            context: the child that needs a token
+            force: drop the cached token (e.g. because the API refused it)
+
+        Returns:
+            str: the token given to the context
+        """
+        if force:
+            self._tokens.invalidate(context.key)
+
+        token = self._tokens.get(context.key)
+        if token is None:
+            account_token = await self._async_get_account_token()
+            try:
+                token = await self._async_change_link(
+                    from_id=context.user_id, to_id=context.target_id, token=account_token
+                )
+            except ApschoolApiClientTokenExpiredError:
+                # The account token was revoked before its expiry
+                self._tokens.invalidate(ACCOUNT_TOKEN_KEY)
+                account_token = await self._async_get_account_token()
+                token = await self._async_change_link(
+                    from_id=context.user_id, to_id=context.target_id, token=account_token
+                )
+            self._tokens.set(context.key, token)
+
+        context.token = token
+        return token
+
+    async def _async_single_flight(
+        self, key: tuple, factory: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Run `factory` once for concurrent calls with the same key
+
+        A call made while another one with the same key is in flight does not
+        send any request, it waits for the result of the first one.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+
+            def _done(done_task: asyncio.Future) -> None:
+                if self._in_flight.get(key) is done_task:
+                    del self._in_flight[key]
+                # Mark the exception as retrieved, the callers got it
+                if not done_task.cancelled():
+                    done_task.exception()
+
+            task.add_done_callback(_done)
+        else:
+            _LOGGER.debug("Joining the request in flight for %s", key)
+
+        # A cancelled caller must not cancel the request of the other callers
+        return await asyncio.shield(task)
+
+    async def _async_get(
+        self,
+        context: LinkContext,
+        path: str,
+        params: dict | None = None,
+        stream_fields: tuple[str, ...] | None = None,
+    ) -> Any:
+        """GET a resource for a child, renewing its token once on a 401
+
+        The responses are cached per child (see ResponseCache).
+        """
+        url = urljoin(self._base_url, path)
+        try:
+            return await self._api_wrapper(
+                method="GET",
+                url=url,
+                headers=self._set_headers(context.token),
+                params=params,
+                stream_fields=stream_fields,
+                cache_key=ResponseCache.key(context.user_id, url, params),
+                revalidate=context.revalidate,
+            )
+        except ApschoolApiClientTokenExpiredError:
+            _LOGGER.debug("Token of user %s refused, renewing it", context.user_id)
+            await self._async_ensure_link_token(context, force=True)
+            return await self._api_wrapper(
+                method="GET",
+                url=url,
+                headers=self._set_headers(context.token),
+                params=params,
+                stream_fields=stream_fields,
+                cache_key=ResponseCache.key(context.user_id, url, params),
+                revalidate=context.revalidate,
+            )
+
+    async def _async_change_link(self, from_id: int, to_id: int, token: str) -> str:
+        """Change link is a method that get a new token for the "to_id",
+            meaning that any request with that token will be dedicated to that ID
+
+        Args:
+            from_id: the user of the account
+            to_id: the target of the link
+            token: the account token
+
+        Returns:
+            str: the bearer token dedicated to the "to_id"
+        """
         url = urljoin(self._base_url,
                       f"authentification/{from_id}/liaisons/{to_id}")
         json_response = await self._api_wrapper(
-            method="POST", url=url, data=None, headers=self._set_headers()
+            method="POST", url=url, data=None, headers=self._set_headers(token)
         )
 
-        self.token = json_response.get("token")
+        return json_response.get("token")
 
-    async def _async_get_balance(self):
-        """Get balance of user
+    async def _async_get_accounts(self, context: LinkContext) -> Accounts:
+        """Get the accounts of user
 
         Returns:
-            list[UnreadMessage]: List of unread messages (only the date and a title)
-            None: When there is no unread message
+            Accounts: the balance and due amount, read from a single /comptes call
         """
-        url = urljoin(
-            self._base_url, f"/mediatr-utilisateurs/{
-                self.current_user_id}/comptes"
-        )
-
-        json_response = await self._api_wrapper(
-            method="GET", url=url, data=None, headers=self._set_headers()
+        # params = {"paye": "false", "refuse": "false"}
+        json_response = await self._async_get(
+            context, f"/mediatr-utilisateurs/{context.user_id}/comptes"
         )
 
-        balance = [
-            res.get("solde") for res in json_response["items"] if res["typeCompte"] == 0
-        ]
+        accounts = self.accounts[context.user_id] = Accounts(json_response)
+        return accounts
 
-        return balance[0] if len(balance) > 0 else 0
-
-    async def _async_get_unread_messages(self):
+    async def _async_get_unread_messages(self, context: LinkContext):
         """Get unread messages
 
+        Only the pages newer than the last sync are downloaded. A full sync is
+        done on the first call, every MESSAGES_FULL_SYNC_EVERY calls (to catch
+        older messages being opened) and when the message count does not add up.
+
         Returns:
             list[UnreadMessage]: List of unread messages (only the date and a title)
             None: When there is no unread message
         """
-        url = urljoin(self._base_url,
-                      f"/utilisateurs/{self.current_user_id}/messages")
+        index = self._message_indexes.setdefault(context.user_id, MessageIndex())
 
-        json_response = await self._api_wrapper(
-            method="GET", url=url, data=None, headers=self._set_headers()
+        full = (
+            index.last_id is None
+            or index.syncs_since_full >= MESSAGES_FULL_SYNC_EVERY
         )
+        if not await self._async_sync_messages(context, index, full) and not full:
+            _LOGGER.debug(
+                "Messages of user %s out of sync, doing a full sync", context.user_id
+            )
+            await self._async_sync_messages(context, index, True)
 
-        messages = [
-            UnreadMessage(res)
-            for res in json_response["items"]
-            if res["ouvert"] is False
-        ]
+        return index.unread_messages()
 
-        return messages if len(messages) > 0 else None
+    async def _async_sync_messages(
+        self, context: LinkContext, index: MessageIndex, full: bool
+    ) -> bool:
+        """Download the message pages and update the index
 
-    async def _async_get_due_amount(self):
-        """Get due amount from fees and others
+        Args:
+            context: the child whose messages are synced
+            index: the messages already seen for that child
+            full: download every page instead of stopping at the known ones
 
         Returns:
-            Total amount still due
+            bool: False when the total of messages does not match the index
         """
-        url = urljoin(self._base_url,
-                      f"/mediatr-utilisateurs/{self.current_user_id}/comptes")
-        # params = {"paye": "false", "refuse": "false"}
+        seen: dict[int, Any] = {}
+        total_items = None
+        page = 1
+        while True:
+            json_response = await self._async_get(
+                context,
+                f"/utilisateurs/{context.user_id}/messages",
+                params={"page": page, "taille": MESSAGES_PAGE_SIZE},
+                stream_fields=MESSAGES_FIELDS,
+            )
+            items = json_response.get("items") or []
+            total_items = json_response.get("totalItems", total_items)
+
+            # The API may ignore the paging, never process an item twice
+            new_items = [item for item in items if item.get("id") not in seen]
+            for item in new_items:
+                seen[item.get("id")] = item
+
+            if (
+                not new_items
+                or len(items) < MESSAGES_PAGE_SIZE
+                or (total_items is not None and len(seen) >= total_items)
+                or (not full and any(index.is_known(item) for item in new_items))
+            ):
+                break
+            page += 1
+
+        if full:
+            index.unread = {}
+            index.apply(seen.values())
+            index.syncs_since_full = 0
+            index.total_items = total_items if total_items is not None else len(seen)
+            return True
+
+        new_count = sum(1 for item in seen.values() if not index.is_known(item))
+        index.apply(seen.values())
+        index.syncs_since_full += 1
+        expected = index.total_items + new_count
+        index.total_items = total_items if total_items is not None else expected
+        return total_items is None or total_items == expected
+
+    async def _async_get_profile(self, context: LinkContext) -> dict:
+        """Get the profile of user
 
-        json_response = await self._api_wrapper(
-            method="GET", url=url, data=None, headers=self._set_headers(),
-        )
+        Returns:
+            dict: the firstname, lastname and school_class
+        """
+        json_response = await self._async_get(context, "/session")
+
+        return {
+            "firstname": json_response.get("prenom"),
+            "lastname": json_response.get("nom"),
+            "school_class": (json_response.get("classe") or {}).get("libelle"),
+        }
+
+    @staticmethod
+    def _kinds_to_fetch(
+        kinds: frozenset[str], previous: UserData | None
+    ) -> frozenset[str]:
+        """Get the kinds to fetch for a child: all of them without previous data,
+        otherwise the requested ones plus the ones that failed last time"""
+        if previous is None:
+            return ALL_DATA
+        return kinds | frozenset(previous.errors)
+
+    async def _async_fetch_kind(self, context: LinkContext, kind: str) -> Any:
+        """Fetch one kind of data of a child"""
+        if kind == DATA_PROFILE:
+            return await self._async_get_profile(context)
+        if kind == DATA_ACCOUNTS:
+            return await self._async_get_accounts(context)
+        if kind == DATA_MESSAGES:
+            return await self._async_get_unread_messages(context)
+        raise ValueError(f"Unknown kind of data: {kind}")
+
+    async def _async_get_link_data(
+        self,
+        context: LinkContext,
+        semaphore: asyncio.Semaphore,
+        kinds: frozenset[str],
+        previous: UserData | None,
+    ) -> UserData:
+        """Run the fetch chain of one linked child
+
+        A failing kind of data does not fail the child: the last known value is
+        kept, the error is recorded in UserData.errors and that kind is fetched
+        again on the next call.
+
+        Args:
+            context: the child to fetch, it receives its own bearer token
+            semaphore: limits how many children are fetched at the same time
+            kinds: the kinds of data to fetch (DATA_PROFILE, DATA_ACCOUNTS, DATA_MESSAGES)
+            previous: the last data of the child, used for the kinds not fetched
+
+        Returns:
+            UserData: The data of the child
+        """
+        kinds = self._kinds_to_fetch(kinds, previous)
+
+        profile = {
+            "firstname": previous.firstname if previous else None,
+            "lastname": previous.lastname if previous else None,
+            "school_class": previous.school_class if previous else None,
+        }
+        balance = previous.balance if previous else None
+        due_amount = previous.due_amount if previous else 0.0
+        unread_messages = previous.unread_messages if previous else None
+        errors: dict[str, str] = {}
+
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                context.token = await self._async_single_flight(
+                    (context.user_id, "link"),
+                    lambda: self._async_ensure_link_token(context),
+                )
+            except ApschoolApiClientError as exception:
+                _LOGGER.warning(
+                    "Could not switch to user %s: %s", context.user_id, exception
+                )
+                errors = {kind: str(exception) for kind in kinds}
 
-        total_amount = sum([float(res["totalAPayer"]) if "totalAPayer" in res else 0
-                            for res in json_response["items"]])
+            for kind in sorted(kinds - set(errors)):
+                try:
+                    result = await self._async_single_flight(
+                        (context.user_id, kind),
+                        lambda kind=kind: self._async_fetch_kind(context, kind),
+                    )
+                    if kind == DATA_PROFILE:
+                        profile = result
+                    elif kind == DATA_ACCOUNTS:
+                        balance = result.balance
+                        due_amount = result.due_amount
+                    elif kind == DATA_MESSAGES:
+                        unread_messages = result
+                except ApschoolApiClientError as exception:
+                    _LOGGER.warning(
+                        "Could not fetch %s of user %s: %s", kind, context.user_id, exception
+                    )
+                    errors[kind] = str(exception)
+            self.metrics.record_child(context.user_id, time.monotonic() - started)
+
+        user_data = UserData(
+            user_id=context.user_id,
+            firstname=profile["firstname"],
+            lastname=profile["lastname"],
+            school_class=profile["school_class"],
+            balance=balance,
+            unread_messages=unread_messages,
+            due_amount=due_amount,
+            errors=errors,
+        )
 
-        return total_amount
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Data retrieved (%s): %s", ", ".join(sorted(kinds)), user_data.to_json())
+        return user_data
 
-    async def async_get_user_data(self) -> list[UserData]:
+    async def async_get_user_data(
+        self,
+        kinds: frozenset[str] = ALL_DATA,
+        previous: dict[int, UserData] | None = None,
+        user_ids: Collection[int] | None = None,
+        revalidate: bool = False,
+    ) -> list[UserData]:
         """Get all the user data from the APSchool website
 
+        The children are fetched concurrently, at most `max_concurrency` at a time.
+        The tokens of the previous call are reused until they expire. A failure
+        is kept to the child and kind of data it happened on (see UserData.errors),
+        the call only fails when nothing at all could be fetched.
+
+        Concurrent calls share the requests in flight for the same child and
+        kind of data, so overlapping refreshes do not send them twice.
+
+        Args:
+            kinds: the kinds of data to fetch, all of them by default
+            previous: the last data by user id. The kinds that are not fetched
+                are taken from it (a child without previous data is fully fetched)
+            user_ids: only fetch these children, all of them by default
+            revalidate: ask the API even for the cached responses that are still
+                fresh (a forced refresh), conditionally when they have validators
+
         Returns:
             List of UserData: The full data
         """
-        links = await self._async_authenticate()
-
-        users = []
-        for link in links:
-            self.current_user_id = link.get("utilisateurId")
-            target_identifier = link.get("identifiantCible")
-            await self._async_change_link(
-                from_id=self.current_user_id, to_id=target_identifier
+        if self.budget.exhausted:
+            raise ApschoolApiClientBudgetExceededError(
+                f"Daily budget of {self.budget.daily_limit} requests spent"
             )
 
-            json_response = await self._api_wrapper(
-                method="GET",
-                url=urljoin(self._base_url, "/session"),
-                data=None,
-                headers=self._set_headers(),
-            )
+        started = time.monotonic()
+        links = await self._async_get_links()
+        if user_ids is not None:
+            links = [link for link in links if link.get("utilisateurId") in user_ids]
+        previous = previous or {}
+
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+        results = await asyncio.gather(
+            *(
+                self._async_get_link_data(
+                    LinkContext(
+                        user_id=link.get("utilisateurId"),
+                        target_id=link.get("identifiantCible"),
+                        revalidate=revalidate,
+                    ),
+                    semaphore,
+                    kinds,
+                    previous.get(link.get("utilisateurId")),
+                )
+                for link in links
+            ),
+            return_exceptions=True,
+        )
 
-            user_data = UserData(
-                user_id=self.current_user_id,
-                firstname=json_response.get("prenom"),
-                lastname=json_response.get("nom"),
-                school_class=json_response.get("classe").get("libelle"),
-                balance=await self._async_get_balance(),
-                unread_messages=await self._async_get_unread_messages(),
-                due_amount=await self._async_get_due_amount(),
+        # Wait for every child before failing, so no request is left dangling
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        if results and all(
+            user.errors
+            and set(user.errors) >= self._kinds_to_fetch(kinds, previous.get(user.user_id))
+            for user in results
+        ):
+            if self.budget.exhausted:
+                raise ApschoolApiClientBudgetExceededError(
+                    f"Daily budget of {self.budget.daily_limit} requests spent"
+                )
+            raise ApschoolApiClientCommunicationError(
+                "No data could be fetched", next(iter(results[0].errors.values()))
             )
 
-            _LOGGER.debug("Data retrieved: %s", user_data.to_json())
-            users.append(user_data)
-
-        return users
+        self.metrics.record_refresh(time.monotonic() - started)
+        return list(results)
 
     async def _api_wrapper(
         self,
@@ -194,35 +608,159 @@ class ApschoolApiClient:
         data: dict | None = None,
         headers: dict | None = None,
         params: dict | None = None,
+        stream_fields: tuple[str, ...] | None = None,
+        cache_key: tuple | None = None,
+        revalidate: bool = False,
     ) -> any:
-        """Get information from the API."""
-        try:
-            async with async_timeout.timeout(10):
-                response = await self._session.request(
-                    method=method,
-                    url=url,
-                    headers=headers,
-                    json=data,
-                    params=params,
+        """Get information from the API.
+
+        With `stream_fields`, the "items" of the response are parsed while it
+        is received and only these fields of each item are kept (see
+        StreamedItems), instead of building the whole document in memory.
+
+        Idempotent requests are retried on timeouts, connection errors, 429 and
+        5xx (see `retry_policy`). After repeated failures of an endpoint its
+        circuit breaker opens and the requests to that endpoint fail right
+        away until it is probed again.
+
+        Every attempt waits for the rate limiter and counts in the daily budget,
+        no request is sent once the budget is spent.
+
+        With a `cache_key`, a cached response without validators is returned
+        while it is fresh (unless `revalidate`), and one with validators is
+        revalidated with a conditional request (a 304 returns the cached object).
+        """
+        cached = self.response_cache.get(cache_key) if cache_key is not None else None
+        if cached is not None and cached.is_fresh() and not revalidate:
+            self.metrics.record_cache_hit()
+            return cached.value
+        if cached is not None and cached.has_validators:
+            headers = {**(headers or {}), **cached.conditional_headers()}
+
+        endpoint = endpoint_name(method, url)
+        circuit_breaker = self.circuit_breakers.setdefault(endpoint, CircuitBreaker())
+        if not circuit_breaker.allow_request():
+            raise ApschoolApiClientCircuitOpenError(
+                f"Too many failures, {endpoint} not called for now",
+            )
+
+        attempt = 1
+        while True:
+            if not self.budget.consume():
+                raise ApschoolApiClientBudgetExceededError(
+                    f"Daily budget of {self.budget.daily_limit} requests spent"
+                )
+            waited = await self.rate_limiter.async_acquire()
+            if waited:
+                self.metrics.record_throttle(waited)
+            try:
+                result = await self._async_request(
+                    method, url, data, headers, params, stream_fields, cache_key, cached
+                )
+            except ApschoolApiClientTransientError as exception:
+                delay = (
+                    self.retry_policy.get_delay(attempt, exception.retry_after)
+                    if method.upper() in IDEMPOTENT_METHODS
+                    else None
                 )
-                if response.status in (400, 401, 403):
+                if delay is None:
+                    circuit_breaker.record_failure()
+                    raise
+                _LOGGER.debug(
+                    "Attempt %s of %s %s failed (%s), retrying in %.1fs",
+                    attempt, method, url, exception, delay,
+                )
+                self.metrics.record_retry(endpoint)
+                await asyncio.sleep(delay)
+                attempt += 1
+            except ApschoolApiClientError:
+                # The API answered, even if it is with an error
+                circuit_breaker.record_success()
+                raise
+            else:
+                circuit_breaker.record_success()
+                return result
+
+    async def _async_request(
+        self,
+        method: str,
+        url: str,
+        data: dict | None = None,
+        headers: dict | None = None,
+        params: dict | None = None,
+        stream_fields: tuple[str, ...] | None = None,
+        cache_key: tuple | None = None,
+        cached: CachedResponse | None = None,
+    ) -> any:
+        """Send one request to the API (and cache its response with a `cache_key`)."""
+        endpoint = endpoint_name(method, url)
+        started = time.monotonic()
+        status = None
+        size = 0
+        try:
+            async with self._session.request(
+                method=method,
+                url=url,
+                headers=headers,
+                json=data,
+                params=params,
+                timeout=self.retry_policy.timeout,
+            ) as response:
+                status = response.status
+                if response.status == 401:
+                    raise ApschoolApiClientTokenExpiredError(
+                        "Token refused",
+                    )
+                if response.status in (400, 403):
                     raise ApschoolApiClientAuthenticationError(
                         "Invalid credentials",
                     )
+                if response.status == 429 or response.status >= 500:
+                    raise ApschoolApiClientTransientError(
+                        f"Server error {response.status}",
+                        retry_after=parse_retry_after(response.headers.get("Retry-After")),
+                    )
+                if response.status == 304 and cached is not None:
+                    self.metrics.record_cache_hit()
+                    return cached.value
                 response.raise_for_status()
-                return await response.json()
+                if stream_fields is not None:
+                    streamed = StreamedItems(response.content, fields=stream_fields)
+                    try:
+                        items = [item async for item in streamed]
+                    finally:
+                        size = streamed.size
+                    result = {**streamed.others, "items": items}
+                else:
+                    body = await response.read()
+                    size = len(body)
+                    result = json.loads(body)
+                if cache_key is not None:
+                    self.response_cache.set(
+                        cache_key,
+                        result,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                    )
+                return result
 
         except asyncio.TimeoutError as exception:
-            raise ApschoolApiClientCommunicationError(
+            raise ApschoolApiClientTransientError(
                 "Timeout error fetching information",
             ) from exception
-        except (aiohttp.ClientError, socket.gaierror) as exception:
+        except (aiohttp.ClientConnectionError, socket.gaierror) as exception:
+            raise ApschoolApiClientTransientError(
+                "Error fetching information", url, str(exception),
+            ) from exception
+        except aiohttp.ClientError as exception:
             raise ApschoolApiClientCommunicationError(
-                "Error fetching information", exception.request_info.url, exception.message,
+                "Error fetching information", url, str(exception),
             ) from exception
-        except ApschoolApiClientAuthenticationError as exception:
+        except ApschoolApiClientError as exception:
             raise exception
         except Exception as exception:  # pylint: disable=broad-except
             raise ApschoolApiClientError(
                 "Something really wrong happened!", exception
             ) from exception
+        finally:
+            self.metrics.record_request(endpoint, status, time.monotonic() - started, size)
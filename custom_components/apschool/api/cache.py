@@ -0,0 +1,117 @@
+"""HTTP response cache
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any
+
+# Responses without validators are reused for this many seconds
+DEFAULT_CACHE_TTL = 30.0
+# Number of responses kept, the least recently used ones are dropped first
+DEFAULT_CACHE_SIZE = 256
+
+
+class CachedResponse:
+    """CachedResponse class
+
+    A parsed response and its validators. Without validators, it is only
+    reused until `expires_at`.
+    """
+
+    value: Any
+    etag: str | None
+    last_modified: str | None
+    expires_at: float | None
+
+    def __init__(
+        self,
+        value: Any,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        expires_at: float | None = None,
+    ) -> None:
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    @property
+    def has_validators(self) -> bool:
+        """Tell whether the response can be revalidated with a conditional request"""
+        return self.etag is not None or self.last_modified is not None
+
+    def is_fresh(self) -> bool:
+        """Tell whether the response can be reused without asking the server"""
+        return self.expires_at is not None and time.monotonic() < self.expires_at
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Headers asking the server to answer 304 if the response did not change"""
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """ResponseCache class
+
+    Parsed GET responses keyed by (user id, URL, params), so that a 304
+    (or a fresh response without validators) returns the object parsed the
+    first time.
+    """
+
+    def __init__(
+        self, ttl: float = DEFAULT_CACHE_TTL, max_entries: int = DEFAULT_CACHE_SIZE
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._responses: OrderedDict[tuple, CachedResponse] = OrderedDict()
+
+    @staticmethod
+    def key(user_id: int, url: str, params: dict | None = None) -> tuple:
+        """Key of a request
+
+        The user id tells the children apart (e.g. /session is the same URL
+        for all of them).
+        """
+        return (
+            user_id,
+            str(url),
+            tuple(sorted((str(name), str(value)) for name, value in (params or {}).items())),
+        )
+
+    def get(self, key: tuple) -> CachedResponse | None:
+        """Get the cached response of a request"""
+        cached = self._responses.get(key)
+        if cached is None:
+            return None
+        if not cached.has_validators and not cached.is_fresh():
+            del self._responses[key]
+            return None
+        self._responses.move_to_end(key)
+        return cached
+
+    def set(
+        self,
+        key: tuple,
+        value: Any,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        """Store the parsed response of a request"""
+        cached = CachedResponse(value, etag, last_modified)
+        if not cached.has_validators:
+            if self.ttl <= 0:
+                self._responses.pop(key, None)
+                return
+            cached.expires_at = time.monotonic() + self.ttl
+        self._responses[key] = cached
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.max_entries:
+            self._responses.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Forget all the responses"""
+        self._responses.clear()
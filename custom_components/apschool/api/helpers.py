@@ -2,54 +2,248 @@
 """
 
 import datetime
+import hashlib
 import json
+from collections.abc import Mapping
+from dataclasses import dataclass, field
 
+# Kinds of data that can be refreshed separately
+DATA_PROFILE = "profile"
+DATA_ACCOUNTS = "accounts"
+DATA_MESSAGES = "messages"
+ALL_DATA = frozenset((DATA_PROFILE, DATA_ACCOUNTS, DATA_MESSAGES))
 
+
+def parse_datetime(value: str | None) -> datetime.datetime | None:
+    """Parse an ISO 8601 date from the API
+
+    Returns:
+        datetime: the parsed date
+        None: when the value is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def fingerprint(*values) -> str:
+    """Short digest of JSON-serializable values, used to detect changes"""
+    return hashlib.blake2b(
+        json.dumps(values, sort_keys=True, default=str).encode(), digest_size=8
+    ).hexdigest()
+
+
+class LinkContext:
+    """LinkContext class
+
+    Holds the request state of one linked child (its user id and the bearer
+    token dedicated to it), so several children can be fetched concurrently.
+    With `revalidate`, its cached responses are revalidated with the API even
+    while they are fresh.
+    """
+
+    user_id: int
+    target_id: int
+    token: str | None = None
+    revalidate: bool = False
+
+    def __init__(
+        self,
+        user_id: int,
+        target_id: int,
+        token: str | None = None,
+        revalidate: bool = False,
+    ) -> None:
+        self.user_id = user_id
+        self.target_id = target_id
+        self.token = token
+        self.revalidate = revalidate
+
+    @property
+    def key(self) -> tuple[int, int]:
+        """Key of the link, used to cache its token"""
+        return (self.user_id, self.target_id)
+
+
+@dataclass(frozen=True, slots=True)
 class UnreadMessage:
     """UnreadMessage class"""
 
     id: int
-    title: str
-    create_at: datetime.datetime
+    title: str | None
+    create_at: datetime.datetime | None
+
+    @classmethod
+    def from_api(cls, json_item) -> "UnreadMessage":
+        """Create the object from a message of the API (its date is parsed once)"""
+        return cls(
+            id=json_item.get("id"),
+            title=json_item.get("titre"),
+            create_at=parse_datetime(json_item.get("dateCreation")),
+        )
+
+    def to_dict(self) -> dict:
+        """Output the object as a dict, in the API format"""
+        return {
+            "id": self.id,
+            "titre": self.title,
+            "dateCreation": self.create_at.isoformat() if self.create_at else None,
+        }
+
+    # The dict format is the API one
+    from_dict = from_api
+
+
+class MessageIndex:
+    """MessageIndex class
+
+    Remembers the messages already seen for a user, so only the newer ones
+    have to be downloaded.
+    """
 
-    def __init__(self, json_item) -> None:
-        self.id = json_item.get("id")
-        self.title = json_item.get("titre")
-        self.create_at = json_item.get("dateCreation")
+    last_id: int | None = None
+    last_date: str | None = None
+    total_items: int = 0
+    syncs_since_full: int = 0
+    unread: dict[int, UnreadMessage]
 
+    def __init__(self) -> None:
+        self.unread = {}
 
+    def is_known(self, json_item) -> bool:
+        """Tell if the message is not newer than the ones already seen"""
+        if self.last_id is None:
+            return False
+        if json_item.get("id") is not None and json_item["id"] <= self.last_id:
+            return True
+        date = json_item.get("dateCreation")
+        return bool(date and self.last_date and date < self.last_date)
+
+    def apply(self, json_items) -> None:
+        """Update the index from (new or refreshed) messages"""
+        for json_item in json_items:
+            message_id = json_item.get("id")
+            if message_id is None:
+                continue
+            if json_item.get("ouvert") is False:
+                self.unread[message_id] = UnreadMessage.from_api(json_item)
+            else:
+                self.unread.pop(message_id, None)
+
+            if self.last_id is None or message_id > self.last_id:
+                self.last_id = message_id
+            date = json_item.get("dateCreation")
+            if date and (self.last_date is None or date > self.last_date):
+                self.last_date = date
+
+    def unread_messages(self) -> tuple[UnreadMessage, ...] | None:
+        """Get the unread messages, the most recent first"""
+        if not self.unread:
+            return None
+        return tuple(self.unread[message_id] for message_id in sorted(self.unread, reverse=True))
+
+
+class Accounts:
+    """Accounts class
+
+    Parsed /comptes payload. Every account-derived value reads from the same
+    snapshot.
+    """
+
+    items: list[dict]
+    balance: float
+    due_amount: float
+
+    def __init__(self, json_response) -> None:
+        self.items = json_response.get("items") or []
+
+        balance = [
+            res.get("solde") for res in self.items if res.get("typeCompte") == 0
+        ]
+        self.balance = balance[0] if len(balance) > 0 else 0
+
+        self.due_amount = sum(
+            float(res["totalAPayer"]) if "totalAPayer" in res else 0
+            for res in self.items
+        )
+
+
+@dataclass(frozen=True, slots=True)
 class UserData:
     """UserData class"""
 
     user_id: int
-    firstname: str
-    lastname: str
-    school_class: str
+    firstname: str | None
+    lastname: str | None
+    school_class: str | None
     balance: float | None = None
-    unread_messages: list[UnreadMessage] | None = None
+    unread_messages: tuple[UnreadMessage, ...] | None = None
     due_amount: float = 0.0
+    # Kinds of data that could not be fetched (their value is the last known one)
+    errors: Mapping[str, str] = field(default_factory=dict)
 
-    def __init__(
-        self,
-        user_id: int,
-        firstname: str,
-        lastname: str,
-        school_class: str,
-        balance: float | None,
-        unread_messages: list[UnreadMessage] | None,
-        due_amount: float,
-    ) -> None:
-        self.user_id = user_id
-        self.firstname = firstname
-        self.lastname = lastname
-        self.school_class = school_class
-        self.balance = balance
-        self.unread_messages = unread_messages
-        self.due_amount = due_amount
-
-    def to_json(self):
-        """Output the object as a inline JSON"""
-        return json.dumps(
-            self,
-            default=lambda o: o.__dict__,
+    @property
+    def unread_count(self) -> int:
+        """Number of unread messages"""
+        return len(self.unread_messages) if self.unread_messages is not None else 0
+
+    def fingerprints(self) -> dict[str, str]:
+        """Fingerprint of each kind of data, errors excluded"""
+        return {
+            DATA_PROFILE: fingerprint(self.firstname, self.lastname, self.school_class),
+            DATA_ACCOUNTS: fingerprint(self.balance, self.due_amount),
+            DATA_MESSAGES: fingerprint(
+                [
+                    (message.id, message.title, message.create_at)
+                    for message in self.unread_messages or []
+                ]
+            ),
+        }
+
+    def to_dict(self) -> dict:
+        """Output the object as a dict that can be stored"""
+        return {
+            "user_id": self.user_id,
+            "firstname": self.firstname,
+            "lastname": self.lastname,
+            "school_class": self.school_class,
+            "balance": self.balance,
+            "unread_messages": (
+                [message.to_dict() for message in self.unread_messages]
+                if self.unread_messages is not None
+                else None
+            ),
+            "due_amount": self.due_amount,
+            "errors": dict(self.errors),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UserData":
+        """Create the object back from the output of to_dict"""
+        unread_messages = data.get("unread_messages")
+        return cls(
+            user_id=data["user_id"],
+            firstname=data.get("firstname"),
+            lastname=data.get("lastname"),
+            school_class=data.get("school_class"),
+            balance=data.get("balance"),
+            unread_messages=(
+                tuple(UnreadMessage.from_dict(message) for message in unread_messages)
+                if unread_messages is not None
+                else None
+            ),
+            due_amount=data.get("due_amount", 0.0),
+            errors=data.get("errors") or {},
         )
+
+    def to_json(self) -> str:
+        """Output the object as a inline JSON"""
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, value: str | bytes) -> "UserData":
+        """Create the object back from the output of to_json"""
+        return cls.from_dict(json.loads(value))
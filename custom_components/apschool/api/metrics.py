@@ -0,0 +1,152 @@
+"""Request instrumentation
+"""
+
+import re
+from urllib.parse import urlsplit
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """Name of the endpoint of a request, the ids are replaced by {id}
+
+    e.g. "GET /utilisateurs/{id}/messages"
+    """
+    return f"{method.upper()} {_ID_SEGMENT.sub('/{id}', urlsplit(str(url)).path)}"
+
+
+class EndpointMetrics:
+    """EndpointMetrics class"""
+
+    requests: int = 0
+    retries: int = 0
+    errors: int = 0
+    response_bytes: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+    statuses: dict[str, int]
+    latency_buckets: list[int]
+
+    def __init__(self) -> None:
+        self.statuses = {}
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+
+    def record(self, status: int | None, latency: float, size: int) -> None:
+        """Record one request"""
+        self.requests += 1
+        key = str(status) if status is not None else "no_response"
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if status is None or status >= 400:
+            self.errors += 1
+        self.response_bytes += size
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.latency_buckets[index] += 1
+                break
+
+    def to_dict(self) -> dict:
+        """Output the metrics as a dict"""
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "statuses": dict(self.statuses),
+            "response_bytes": self.response_bytes,
+            "latency_avg": (
+                round(self.latency_total / self.requests, 4) if self.requests else None
+            ),
+            "latency_max": round(self.latency_max, 4),
+            "latency_histogram": {
+                f"le_{bound}": count
+                for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets)
+            },
+        }
+
+
+class ApiMetrics:
+    """ApiMetrics class
+
+    Counters of the requests sent by a client, by endpoint, and the duration
+    of the refreshes.
+    """
+
+    endpoints: dict[str, EndpointMetrics]
+    # Duration (in seconds) of the last fetch of each child, by user id
+    child_durations: dict[int, float]
+    last_refresh_duration: float | None = None
+    refreshes: int = 0
+    # Requests delayed by the rate limiter, and how long they waited (in seconds)
+    throttled: int = 0
+    throttle_time: float = 0.0
+    # Responses served from the cache (fresh, or revalidated by a 304)
+    cache_hits: int = 0
+
+    def __init__(self) -> None:
+        self.endpoints = {}
+        self.child_durations = {}
+
+    def _endpoint(self, endpoint: str) -> EndpointMetrics:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = EndpointMetrics()
+        return self.endpoints[endpoint]
+
+    def record_request(
+        self, endpoint: str, status: int | None, latency: float, size: int = 0
+    ) -> None:
+        """Record one request sent to an endpoint"""
+        self._endpoint(endpoint).record(status, latency, size)
+
+    def record_retry(self, endpoint: str) -> None:
+        """Record that a request to an endpoint is retried"""
+        self._endpoint(endpoint).retries += 1
+
+    def record_child(self, user_id: int, duration: float) -> None:
+        """Record the duration of the fetch of a child"""
+        self.child_durations[user_id] = duration
+
+    def record_throttle(self, waited: float) -> None:
+        """Record that a request waited for the rate limiter"""
+        self.throttled += 1
+        self.throttle_time += waited
+
+    def record_cache_hit(self) -> None:
+        """Record that a response was served from the cache"""
+        self.cache_hits += 1
+
+    def record_refresh(self, duration: float) -> None:
+        """Record the duration of a whole refresh"""
+        self.refreshes += 1
+        self.last_refresh_duration = duration
+
+    @property
+    def total_requests(self) -> int:
+        """Number of requests sent to all the endpoints"""
+        return sum(metrics.requests for metrics in self.endpoints.values())
+
+    def to_dict(self) -> dict:
+        """Output the metrics as a dict"""
+        return {
+            "refreshes": self.refreshes,
+            "total_requests": self.total_requests,
+            "last_refresh_duration": (
+                round(self.last_refresh_duration, 4)
+                if self.last_refresh_duration is not None
+                else None
+            ),
+            "cache_hits": self.cache_hits,
+            "throttled": self.throttled,
+            "throttle_time": round(self.throttle_time, 4),
+            "child_durations": {
+                str(user_id): round(duration, 4)
+                for user_id, duration in self.child_durations.items()
+            },
+            "endpoints": {
+                endpoint: metrics.to_dict()
+                for endpoint, metrics in sorted(self.endpoints.items())
+            },
+        }
@@ -0,0 +1,248 @@
+"""Retry policy, circuit breaker, rate limiter and request budget
+"""
+
+import asyncio
+import datetime
+import email.utils
+import random
+import time
+
+import aiohttp
+
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_FACTOR = 1.0
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 10.0
+# Without an explicit total timeout, a whole request is bounded by this many read timeouts
+TOTAL_TIMEOUT_FACTOR = 3
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_TIME = 120.0
+
+# Requests per second, and number of requests that can be sent at once
+DEFAULT_RATE = 2.0
+DEFAULT_BURST = 10
+# Requests per account and per (UTC) day
+DEFAULT_DAILY_BUDGET = 5000
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header (a number of seconds or an HTTP date)
+
+    Returns:
+        float: the number of seconds to wait
+        None: when the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """RetryPolicy class
+
+    Exponential backoff with full jitter, used for the idempotent requests.
+    """
+
+    max_retries: int
+    backoff_factor: float
+    max_backoff: float
+    connect_timeout: float
+    read_timeout: float
+    total_timeout: float | None
+
+    def __init__(
+        self,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        total_timeout: float | None = None,
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+
+    @property
+    def timeout(self) -> aiohttp.ClientTimeout:
+        """Timeout of one request
+
+        The connection and each read are bounded separately, and the whole
+        request (waiting for a pooled connection, connecting, reading the
+        body) is bounded by `total_timeout`, so a server that trickles bytes
+        cannot hang a refresh.
+        """
+        total = self.total_timeout
+        if total is None:
+            total = self.connect_timeout + TOTAL_TIMEOUT_FACTOR * self.read_timeout
+        return aiohttp.ClientTimeout(
+            total=total,
+            sock_connect=self.connect_timeout,
+            sock_read=self.read_timeout,
+        )
+
+    def get_delay(self, attempt: int, retry_after: float | None = None) -> float | None:
+        """Get the delay before the next attempt
+
+        Args:
+            attempt: the number of the attempt that just failed (starting at 1)
+            retry_after: the delay asked by the server, if any
+
+        Returns:
+            float: the number of seconds to wait
+            None: when the request should not be retried
+        """
+        if attempt > self.max_retries:
+            return None
+        if retry_after is not None:
+            if retry_after > self.max_backoff:
+                return None
+            return retry_after + random.uniform(0, self.backoff_factor)
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff_factor * 2 ** (attempt - 1))
+        )
+
+
+class CircuitBreaker:
+    """CircuitBreaker class
+
+    Opens after `failure_threshold` consecutive failures: no request is sent
+    for `recovery_time` seconds, then a single request probes the API. The
+    circuit closes again on the first success.
+
+    The client keeps one per endpoint, so that the successes of the other
+    endpoints do not hide a partial outage.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        recovery_time: float = DEFAULT_RECOVERY_TIME,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    def allow_request(self) -> bool:
+        """Tell if a request can be sent"""
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at >= self.recovery_time:
+            # Let a single request probe the API (another one is allowed if
+            # that probe never reports back)
+            self.state = self.HALF_OPEN
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """The API answered"""
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        """The API could not be reached (after the retries)"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class TokenBucket:
+    """TokenBucket class
+
+    Rate limiter: up to `capacity` requests can be sent at once, then
+    `rate` requests per second. The callers that exceed it wait for their
+    turn, in the order they came.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: int = DEFAULT_BURST) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def async_acquire(self) -> float:
+        """Take a token, waiting until one is available
+
+        Returns:
+            float: the number of seconds waited
+        """
+        async with self._lock:
+            self._refill()
+            waited = 0.0
+            if self.tokens < 1:
+                waited = (1 - self.tokens) / self.rate
+                await asyncio.sleep(waited)
+                self._refill()
+            self.tokens -= 1
+            return waited
+
+
+class RequestBudget:
+    """RequestBudget class
+
+    Number of requests allowed per (UTC) day.
+    """
+
+    def __init__(self, daily_limit: int = DEFAULT_DAILY_BUDGET) -> None:
+        self.daily_limit = daily_limit
+        self.day: datetime.date | None = None
+        self.used = 0
+
+    def _roll(self) -> None:
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        if today != self.day:
+            self.day = today
+            self.used = 0
+
+    @property
+    def remaining(self) -> int:
+        """Number of requests left for today"""
+        self._roll()
+        return max(0, self.daily_limit - self.used)
+
+    @property
+    def exhausted(self) -> bool:
+        """Tell whether no request is left for today"""
+        return self.remaining == 0
+
+    def consume(self) -> bool:
+        """Count a request
+
+        Returns:
+            bool: False when the budget of the day is spent (the request must not be sent)
+        """
+        if self.exhausted:
+            return False
+        self.used += 1
+        return True
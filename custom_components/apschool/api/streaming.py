@@ -0,0 +1,118 @@
+"""Incremental parsing of JSON responses
+"""
+
+import codecs
+import json
+import re
+from collections.abc import AsyncIterator
+
+import aiohttp
+
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+_WHITESPACE = " \t\n\r"
+# What may follow the part of a number already received (e.g. "2." of "2.5e10")
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+class StreamedItems:
+    """StreamedItems class
+
+    Iterates over the items of an array member (e.g. "items") of a JSON
+    object while the response is being received, keeping only some fields of
+    each item. Only one item is decoded at a time, so the peak memory does
+    not depend on the size of the response. The other members of the object
+    (e.g. "totalItems") are collected in `others`.
+    """
+
+    def __init__(
+        self,
+        content: aiohttp.StreamReader,
+        key: str = "items",
+        fields: tuple[str, ...] | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        self._content = content
+        self._key = key
+        self._fields = fields
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self.others: dict = {}
+        self.size = 0
+
+    async def _async_fill(self) -> None:
+        """Read the next chunk of the response"""
+        if self._eof:
+            raise ValueError("Unexpected end of the JSON document")
+        chunk = await self._content.read(self._chunk_size)
+        self.size += len(chunk)
+        if not chunk:
+            self._eof = True
+        self._buffer = self._buffer[self._pos:] + self._text_decoder.decode(
+            chunk, final=not chunk
+        )
+        self._pos = 0
+
+    async def _async_next_char(self) -> str:
+        """Skip the whitespaces and return the next character (not consumed)"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            await self._async_fill()
+
+    async def _async_expect(self, expected: str) -> str:
+        """Consume the next character, which must be one of `expected`"""
+        char = await self._async_next_char()
+        if char not in expected:
+            raise ValueError(f"Expected one of {expected!r}, got {char!r}")
+        self._pos += 1
+        return char
+
+    async def _async_decode_value(self):
+        """Decode the next JSON value, reading more of the response as needed"""
+        await self._async_next_char()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                await self._async_fill()
+                continue
+            # A number may be cut by the end of the buffer (e.g. "2." is decoded
+            # as 2), make sure nothing but the end of the buffer follows it
+            if not self._eof and _NUMBER_TAIL.fullmatch(self._buffer, end):
+                await self._async_fill()
+                continue
+            self._pos = end
+            return value
+
+    def _filter(self, item):
+        if self._fields is None or not isinstance(item, dict):
+            return item
+        return {field: item[field] for field in self._fields if field in item}
+
+    async def __aiter__(self) -> AsyncIterator:
+        await self._async_expect("{")
+        if await self._async_next_char() == "}":
+            return
+        while True:
+            key = await self._async_decode_value()
+            await self._async_expect(":")
+            if key == self._key and await self._async_next_char() == "[":
+                self._pos += 1
+                if await self._async_next_char() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._filter(await self._async_decode_value())
+                        if await self._async_expect(",]") == "]":
+                            break
+            else:
+                self.others[key] = await self._async_decode_value()
+            if await self._async_expect(",}") == "}":
+                return
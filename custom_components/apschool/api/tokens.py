@@ -0,0 +1,88 @@
+"""Bearer token cache
+"""
+
+import base64
+import binascii
+import json
+import time
+from typing import Any
+
+# Tokens are considered expired this many seconds before their real expiry
+TOKEN_EXPIRY_MARGIN = 60
+# Lifetime assumed for a token that does not carry an "exp" claim
+DEFAULT_TOKEN_LIFETIME = 15 * 60
+
+# Key of the account token (the one returned by the authentication)
+ACCOUNT_TOKEN_KEY = (None, None)
+
+
+def decode_token_claims(token: str) -> dict[str, Any]:
+    """Decode the claims of a JWT without verifying its signature
+
+    Returns:
+        dict: the claims, empty when the token is not a readable JWT
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except (AttributeError, IndexError, ValueError, binascii.Error):
+        return {}
+
+    return claims if isinstance(claims, dict) else {}
+
+
+class CachedToken:
+    """CachedToken class"""
+
+    token: str
+    expires_at: float
+
+    def __init__(self, token: str, expires_at: float) -> None:
+        self.token = token
+        self.expires_at = expires_at
+
+
+class TokenStore:
+    """Keep the bearer tokens until shortly before they expire
+
+    Tokens are keyed by (utilisateurId, identifiantCible), the account token
+    is stored under ACCOUNT_TOKEN_KEY.
+    """
+
+    def __init__(self, margin: float = TOKEN_EXPIRY_MARGIN) -> None:
+        self._margin = margin
+        self._tokens: dict[tuple, CachedToken] = {}
+
+    def get(self, key: tuple) -> str | None:
+        """Get a token that is still valid
+
+        Returns:
+            str: the token
+            None: when there is no token or it is about to expire
+        """
+        cached = self._tokens.get(key)
+        if cached is None:
+            return None
+        if cached.expires_at - self._margin <= time.time():
+            del self._tokens[key]
+            return None
+        return cached.token
+
+    def set(self, key: tuple, token: str | None) -> None:
+        """Store a token, its expiry is read from its "exp" claim"""
+        if not token:
+            self._tokens.pop(key, None)
+            return
+
+        expires_at = decode_token_claims(token).get("exp")
+        if not isinstance(expires_at, (int, float)):
+            expires_at = time.time() + DEFAULT_TOKEN_LIFETIME
+        self._tokens[key] = CachedToken(token, expires_at)
+
+    def invalidate(self, key: tuple | None = None) -> None:
+        """Forget one token, or all of them when no key is given"""
+        if key is None:
+            self._tokens.clear()
+        else:
+            self._tokens.pop(key, None)
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+from collections.abc import Mapping
 from typing import Any
 
 import homeassistant.helpers.config_validation as cv
@@ -13,17 +14,37 @@ from homeassistant.const import __version__ as HAVERSION
 from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.helpers import selector
-from homeassistant.helpers.aiohttp_client import async_create_clientsession
-
-from custom_components.apschool.api.helpers import UserData
 
 from .api.apschool import (
-    ApschoolApiClient,
     ApschoolApiClientAuthenticationError,
     ApschoolApiClientCommunicationError,
     ApschoolApiClientError,
 )
-from .const import BASE_URL, DEFAULT_SCAN_INTERVAL, DOMAIN, LOGGER, MIN_SCAN_INTERVAL
+from .const import (
+    BASE_URL,
+    CONF_ADAPTIVE_POLLING,
+    CONF_MAX_CONCURRENCY,
+    CONF_MAX_RETRIES,
+    CONF_MESSAGES_INTERVAL,
+    CONF_PROFILE_INTERVAL,
+    CONF_QUIET_END,
+    CONF_QUIET_START,
+    CONF_REQUEST_TIMEOUT,
+    DEFAULT_ADAPTIVE_POLLING,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_MESSAGES_INTERVAL,
+    DEFAULT_PROFILE_INTERVAL,
+    DEFAULT_QUIET_END,
+    DEFAULT_QUIET_START,
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_SCAN_INTERVAL,
+    DOMAIN,
+    LOGGER,
+    MIN_MESSAGES_INTERVAL,
+    MIN_SCAN_INTERVAL,
+)
+from .hub import async_validate_credentials
 
 
 class ApschoolFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
@@ -31,6 +52,8 @@ class ApschoolFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    _reauth_entry: config_entries.ConfigEntry | None = None
+
     async def async_step_user(
         self,
         user_input: dict | None = None,
@@ -40,7 +63,8 @@ class ApschoolFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
 
         if user_input is not None:
             try:
-                await self._check_credentials_and_get_name(
+                await async_validate_credentials(
+                    self.hass,
                     base_url=user_input["base_url"],
                     username=user_input[CONF_USERNAME],
                     password=user_input[CONF_PASSWORD],
@@ -83,18 +107,63 @@ class ApschoolFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             errors=_errors,
         )
 
-    async def _check_credentials_and_get_name(
-        self, base_url: str, username: str, password: str
-    ) -> list[UserData]:
-        """Validate credentials and get user data to setup the entry"""
-        client: ApschoolApiClient = ApschoolApiClient(
-            base_url=base_url,
-            username=username,
-            password=password,
-            session=async_create_clientsession(self.hass),
+    async def async_step_reauth(self, entry_data: Mapping[str, Any]) -> FlowResult:
+        """Handle a flow started by refused credentials."""
+        self._reauth_entry = self.hass.config_entries.async_get_entry(
+            self.context["entry_id"]
         )
+        return await self.async_step_reauth_confirm()
 
-        return await client.async_get_user_data()
+    async def async_step_reauth_confirm(
+        self,
+        user_input: dict | None = None,
+    ) -> FlowResult:
+        """Ask the new password of the account and check it."""
+        _errors = {}
+        entry = self._reauth_entry
+
+        if user_input is not None:
+            try:
+                await async_validate_credentials(
+                    self.hass,
+                    base_url=entry.data["base_url"],
+                    username=entry.data[CONF_USERNAME],
+                    password=user_input[CONF_PASSWORD],
+                )
+            except ApschoolApiClientAuthenticationError as exception:
+                LOGGER.warning(exception)
+                _errors["base"] = "auth"
+            except ApschoolApiClientCommunicationError as exception:
+                LOGGER.error(exception)
+                _errors["base"] = "connection"
+            except ApschoolApiClientError as exception:
+                LOGGER.exception(exception)
+                _errors["base"] = "unknown"
+            else:
+                # A loaded entry is reloaded by its update listener (its data changed)
+                self.hass.config_entries.async_update_entry(
+                    entry, data={**entry.data, CONF_PASSWORD: user_input[CONF_PASSWORD]}
+                )
+                if entry.state is not config_entries.ConfigEntryState.LOADED:
+                    self.hass.async_create_task(
+                        self.hass.config_entries.async_reload(entry.entry_id)
+                    )
+                return self.async_abort(reason="reauth_successful")
+
+        return self.async_show_form(
+            step_id="reauth_confirm",
+            description_placeholders={CONF_USERNAME: entry.data[CONF_USERNAME]},
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_PASSWORD): selector.TextSelector(
+                        selector.TextSelectorConfig(
+                            type=selector.TextSelectorType.PASSWORD
+                        ),
+                    ),
+                }
+            ),
+            errors=_errors,
+        )
 
     @staticmethod
     @callback
@@ -125,12 +194,60 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             step_id="init",
             data_schema=vol.Schema(
                 {
+                    vol.Optional(
+                        CONF_PROFILE_INTERVAL,
+                        default=self.config_entry.options.get(
+                            CONF_PROFILE_INTERVAL, DEFAULT_PROFILE_INTERVAL
+                        ),
+                    ): (vol.All(vol.Coerce(int), vol.Clamp(min=MIN_SCAN_INTERVAL))),
                     vol.Optional(
                         CONF_SCAN_INTERVAL,
                         default=self.config_entry.options.get(
                             CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL
                         ),
                     ): (vol.All(vol.Coerce(int), vol.Clamp(min=MIN_SCAN_INTERVAL))),
+                    vol.Optional(
+                        CONF_MESSAGES_INTERVAL,
+                        default=self.config_entry.options.get(
+                            CONF_MESSAGES_INTERVAL, DEFAULT_MESSAGES_INTERVAL
+                        ),
+                    ): (vol.All(vol.Coerce(int), vol.Clamp(min=MIN_MESSAGES_INTERVAL))),
+                    vol.Optional(
+                        CONF_ADAPTIVE_POLLING,
+                        default=self.config_entry.options.get(
+                            CONF_ADAPTIVE_POLLING, DEFAULT_ADAPTIVE_POLLING
+                        ),
+                    ): selector.BooleanSelector(),
+                    vol.Optional(
+                        CONF_QUIET_START,
+                        default=self.config_entry.options.get(
+                            CONF_QUIET_START, DEFAULT_QUIET_START
+                        ),
+                    ): selector.TimeSelector(),
+                    vol.Optional(
+                        CONF_QUIET_END,
+                        default=self.config_entry.options.get(
+                            CONF_QUIET_END, DEFAULT_QUIET_END
+                        ),
+                    ): selector.TimeSelector(),
+                    vol.Optional(
+                        CONF_MAX_CONCURRENCY,
+                        default=self.config_entry.options.get(
+                            CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY
+                        ),
+                    ): (vol.All(vol.Coerce(int), vol.Clamp(min=1))),
+                    vol.Optional(
+                        CONF_REQUEST_TIMEOUT,
+                        default=self.config_entry.options.get(
+                            CONF_REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT
+                        ),
+                    ): (vol.All(vol.Coerce(int), vol.Clamp(min=1))),
+                    vol.Optional(
+                        CONF_MAX_RETRIES,
+                        default=self.config_entry.options.get(
+                            CONF_MAX_RETRIES, DEFAULT_MAX_RETRIES
+                        ),
+                    ): (vol.All(vol.Coerce(int), vol.Clamp(min=0))),
                 }
             ),
         )
@@ -7,7 +7,44 @@ LOGGER: Logger = getLogger(__package__)
 BASE_URL = "https://api.plateforme.apschool.be"
 NAME = "APSchool"
 DOMAIN = "apschool"
+# hass.data key of the clients shared by the entries of an account (see hub.py)
+DATA_HUBS = f"{DOMAIN}_hubs"
+# hass.data key of the rate limiters and request budgets of the accounts (see hub.py)
+DATA_LIMITS = f"{DOMAIN}_limits"
+# hass.data key of the accounts history shared by the entries (see history.py)
+DATA_HISTORY = f"{DOMAIN}_history"
 DEFAULT_SCAN_INTERVAL = 60
 MIN_SCAN_INTERVAL = 10
+CONF_PROFILE_INTERVAL = "profile_interval"
+DEFAULT_PROFILE_INTERVAL = 24 * 60
+CONF_MESSAGES_INTERVAL = "messages_interval"
+DEFAULT_MESSAGES_INTERVAL = 10
+MIN_MESSAGES_INTERVAL = 2
+CONF_ADAPTIVE_POLLING = "adaptive_polling"
+DEFAULT_ADAPTIVE_POLLING = True
+CONF_QUIET_START = "quiet_start"
+DEFAULT_QUIET_START = "22:00:00"
+CONF_QUIET_END = "quiet_end"
+DEFAULT_QUIET_END = "06:00:00"
+CONF_MAX_CONCURRENCY = "max_concurrency"
+DEFAULT_MAX_CONCURRENCY = 4
+CONF_REQUEST_TIMEOUT = "request_timeout"
+DEFAULT_REQUEST_TIMEOUT = 10
+CONF_MAX_RETRIES = "max_retries"
+DEFAULT_MAX_RETRIES = 2
 VERSION = "0.0.1"
 ATTRIBUTION = "Data provided by https://plateforme.apschool.be/"
+
+# Prefix of the device registry identifiers of the children
+CHILD_DEVICE_PREFIX = "child_"
+
+# Fired for each new unread message
+EVENT_NEW_MESSAGE = f"{DOMAIN}_new_message"
+EVENT_TYPE_NEW_MESSAGE = "new_message"
+
+SERVICE_REFRESH = "refresh"
+SERVICE_GET_SPENDING = "get_spending"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_USER_ID = "user_id"
+ATTR_KIND = "kind"
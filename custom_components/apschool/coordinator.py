@@ -2,28 +2,162 @@
 
 from __future__ import annotations
 
-from datetime import timedelta
+import asyncio
+import os
+import sqlite3
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Any
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.const import CONF_SCAN_INTERVAL
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
     UpdateFailed,
 )
-from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.util import dt as dt_util
+from homeassistant.exceptions import ConfigEntryAuthFailed, HomeAssistantError
 
 from .api.apschool import (
     ApschoolApiClient,
     ApschoolApiClientAuthenticationError,
+    ApschoolApiClientBudgetExceededError,
+    ApschoolApiClientCommunicationError,
     ApschoolApiClientError,
 )
-from .const import DOMAIN, LOGGER, DEFAULT_SCAN_INTERVAL
+from .api.helpers import (
+    ALL_DATA,
+    DATA_ACCOUNTS,
+    DATA_MESSAGES,
+    DATA_PROFILE,
+    UnreadMessage,
+    UserData,
+)
+from .const import (
+    CHILD_DEVICE_PREFIX,
+    CONF_ADAPTIVE_POLLING,
+    CONF_MESSAGES_INTERVAL,
+    CONF_PROFILE_INTERVAL,
+    CONF_QUIET_END,
+    CONF_QUIET_START,
+    DATA_HISTORY,
+    DEFAULT_ADAPTIVE_POLLING,
+    DEFAULT_MESSAGES_INTERVAL,
+    DEFAULT_PROFILE_INTERVAL,
+    DEFAULT_QUIET_END,
+    DEFAULT_QUIET_START,
+    DOMAIN,
+    EVENT_NEW_MESSAGE,
+    LOGGER,
+    DEFAULT_SCAN_INTERVAL,
+)
+from .history import HISTORY_FILE, AccountHistory
+from .scheduler import AdaptiveScheduler
+
+STORAGE_VERSION = 1
+# Delay (in seconds) before the snapshot is written to disk
+STORAGE_SAVE_DELAY = 10
+# A kind of data is refreshed when its interval elapsed, give or take this tolerance
+REFRESH_TOLERANCE = timedelta(seconds=30)
+# The coordinator never ticks more often than this
+MIN_TICK = timedelta(minutes=1)
+# The last data is served through an API outage, until it lasted that long
+OUTAGE_TOLERANCE = timedelta(hours=2)
+
+
+def intervals_from_options(options: Mapping[str, Any]) -> dict[str, timedelta]:
+    """Refresh interval of each kind of data, from the options of the entry"""
+    return {
+        DATA_PROFILE: timedelta(
+            minutes=options.get(CONF_PROFILE_INTERVAL, DEFAULT_PROFILE_INTERVAL)
+        ),
+        DATA_ACCOUNTS: timedelta(
+            minutes=options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
+        ),
+        DATA_MESSAGES: timedelta(
+            minutes=options.get(CONF_MESSAGES_INTERVAL, DEFAULT_MESSAGES_INTERVAL)
+        ),
+    }
+
+
+def message_event_data(message: UnreadMessage) -> dict:
+    """Data of the event of a new message"""
+    return {
+        "id": message.id,
+        "title": message.title,
+        "date": message.create_at.isoformat() if message.create_at is not None else None,
+    }
+
+
+async def async_forget_history(
+    hass: HomeAssistant, user_ids: set[int], entry_id: str
+) -> None:
+    """Delete the accounts history of children an entry does not follow anymore
+
+    The children still in the data of another entry (e.g. also linked to
+    another parent account) keep their history.
+
+    Args:
+        hass: Home Assistant
+        user_ids: the children gone from the entry
+        entry_id: the entry they are gone from
+    """
+    user_ids = user_ids - {
+        user_id
+        for other_entry_id, coordinator in hass.data.get(DOMAIN, {}).items()
+        if other_entry_id != entry_id
+        for user_id in coordinator.data or ()
+    }
+    if not user_ids:
+        return
+    history: AccountHistory | None = hass.data.get(DATA_HISTORY)
+    path = hass.config.path(HISTORY_FILE)
+
+    def _forget() -> int:
+        if history is not None:
+            return history.forget(user_ids)
+        # No entry is loaded, the database is opened for the deletion only
+        if not os.path.exists(path):
+            return 0
+        standalone = AccountHistory(path)
+        try:
+            return standalone.forget(user_ids)
+        finally:
+            standalone.close()
+
+    try:
+        deleted = await hass.async_add_executor_job(_forget)
+    except sqlite3.Error as exception:
+        LOGGER.warning("Could not delete the accounts history: %s", exception)
+    else:
+        LOGGER.debug("%s history row(s) of %s deleted", deleted, sorted(user_ids))
 
 
 # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
-class ApschoolDataUpdateCoordinator(DataUpdateCoordinator):
-    """Class to manage fetching data from the API."""
+class ApschoolDataUpdateCoordinator(DataUpdateCoordinator[dict[int, UserData]]):
+    """Class to manage fetching data from the API.
+
+    The data is a dict of UserData keyed by user_id. Each poll is compared
+    with the previous one through the fingerprints of the users: `changes`
+    tells which kinds of data changed for which user, and when nothing
+    changed at all the listeners are not called.
+
+    The unread messages that were not unread at the previous poll are in
+    `new_messages`, and an EVENT_NEW_MESSAGE event is fired for each of them.
+
+    With adaptive polling, the changes also drive the refresh intervals (see
+    AdaptiveScheduler), and the coordinator ticks when the next kind is due.
+
+    When the API cannot be reached, the last data (polled or restored) is
+    kept and the entities stay available, until the outage lasted
+    OUTAGE_TOLERANCE.
+
+    The scheduled refreshes and the ones asked by a service call run one at a
+    time, so each of them starts from the data published by the other.
+    """
 
     config_entry: ConfigEntry
 
@@ -32,23 +166,472 @@ class ApschoolDataUpdateCoordinator(DataUpdateCoordinator):
         hass: HomeAssistant,
         client: ApschoolApiClient,
         config_entry: ConfigEntry,
+        history: AccountHistory | None = None,
     ) -> None:
         """Initialize."""
-        interval = timedelta(
-            minutes=config_entry.options.get(
-                CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
-        )
+        # Each kind of data has its own refresh interval, the coordinator
+        # ticks at the shortest one and refreshes only the kinds that are due
+        self.intervals = intervals_from_options(config_entry.options)
         super().__init__(
-            hass=hass, logger=LOGGER, name=DOMAIN, update_interval=interval
+            hass=hass,
+            logger=LOGGER,
+            name=DOMAIN,
+            update_interval=min(self.intervals.values()),
+            # The same data object is returned when nothing changed
+            always_update=False,
         )
 
+        self.scheduler: AdaptiveScheduler | None = None
+        self._apply_scheduler_options(config_entry.options)
+
+        # The entry is reloaded when its data changes, not its options
+        self.entry_data = dict(config_entry.data)
         self.client = client
+        self.history = history
+        # When each kind of data is due for a refresh
+        self._next_refresh: dict[str, datetime] = {}
+        # Held by the scheduled and the requested refreshes
+        self._refresh_lock = asyncio.Lock()
+        # When the API started failing, None while it answers
+        self._failing_since: datetime | None = None
+        self.fingerprints: dict[int, dict[str, str]] = {}
+        # Kinds of data that changed during the last poll, by user_id
+        self.changes: dict[int, frozenset[str]] = {}
+        # Unread messages that appeared during the last poll, by user_id
+        self.new_messages: dict[int, tuple[UnreadMessage, ...]] = {}
+        # Called after every refresh, even the ones that changed nothing
+        self._refresh_listeners: list[CALLBACK_TYPE] = []
+        self._store = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{config_entry.entry_id}"
+        )
+
+    @callback
+    def async_add_refresh_listener(self, update_callback: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """Listen to every refresh, also the ones the listeners are not called for
+
+        The data listeners are skipped when nothing changed, but the metrics of
+        the client change with every refresh.
+
+        Returns:
+            CALLBACK_TYPE: removes the listener
+        """
+        self._refresh_listeners.append(update_callback)
+
+        @callback
+        def _async_remove_listener() -> None:
+            self._refresh_listeners.remove(update_callback)
+
+        return _async_remove_listener
+
+    @callback
+    def _async_notify_refresh_listeners(self) -> None:
+        """Call the listeners of the refreshes"""
+        for update_callback in list(self._refresh_listeners):
+            update_callback()
+
+    def _apply_scheduler_options(self, options: Mapping[str, Any]) -> None:
+        """Create, update or drop the adaptive scheduler (its learned state is kept)"""
+        if not options.get(CONF_ADAPTIVE_POLLING, DEFAULT_ADAPTIVE_POLLING):
+            self.scheduler = None
+            return
+        if self.scheduler is None:
+            self.scheduler = AdaptiveScheduler(self.intervals)
+        self.scheduler.intervals = self.intervals
+        self.scheduler.quiet_start = dt_util.parse_time(
+            options.get(CONF_QUIET_START, DEFAULT_QUIET_START)
+        )
+        self.scheduler.quiet_end = dt_util.parse_time(
+            options.get(CONF_QUIET_END, DEFAULT_QUIET_END)
+        )
+
+    async def async_apply_options(self, options: Mapping[str, Any]) -> None:
+        """Apply new options to the running coordinator
+
+        The kinds of data whose interval got shorter are refreshed sooner, the
+        ones whose interval got longer keep their next refresh.
+        """
+        self.intervals = intervals_from_options(options)
+        self._apply_scheduler_options(options)
+
+        now = dt_util.utcnow()
+        for kind, next_refresh in self._next_refresh.items():
+            self._next_refresh[kind] = min(next_refresh, now + self.intervals[kind])
+        if self.scheduler is None:
+            self.update_interval = min(self.intervals.values())
+        elif self._next_refresh:
+            self.update_interval = max(MIN_TICK, min(self._next_refresh.values()) - now)
+        # Let the coordinator reschedule its next tick (only the due kinds are fetched)
+        await self.async_request_refresh()
+
+    async def async_restore_snapshot(self) -> bool:
+        """Restore the data saved by the last successful refresh
+
+        Returns:
+            bool: True when a snapshot was restored
+        """
+        stored = await self._store.async_load()
+        if not stored:
+            return False
+        if self.scheduler is not None and stored.get("scheduler"):
+            self.scheduler.restore(stored["scheduler"])
+        if not stored.get("users"):
+            return False
+
+        self.data = {
+            user.user_id: user
+            for user in (UserData.from_dict(user) for user in stored["users"])
+        }
+        self.fingerprints = {
+            user_id: user.fingerprints() for user_id, user in self.data.items()
+        }
+        self.changes = {user_id: ALL_DATA for user_id in self.data}
+        LOGGER.debug("Restored %s user(s) from the snapshot", len(self.data))
+        return True
+
+    def _due_kinds(self, now: datetime) -> frozenset[str]:
+        """Get the kinds of data whose refresh interval elapsed"""
+        return frozenset(
+            kind
+            for kind in self.intervals
+            if kind not in self._next_refresh
+            or now >= self._next_refresh[kind] - REFRESH_TOLERANCE
+        )
+
+    def _schedule(
+        self,
+        kinds: frozenset[str],
+        users: list[UserData],
+        changes: dict[int, frozenset[str]],
+        known_user_ids: set[int],
+        now: datetime,
+    ) -> bool:
+        """Plan the next refresh of the kinds of data that were just refreshed
+
+        Args:
+            kinds: the kinds of data that were refreshed
+            users: the refreshed users
+            changes: the kinds of data that changed, by user_id
+            known_user_ids: the users that had been refreshed before
+            now: when they were refreshed
+
+        Returns:
+            bool: True when the backoff learned by the scheduler changed
+        """
+        if self.scheduler is None:
+            for kind in kinds:
+                self._next_refresh[kind] = now + self.intervals[kind]
+            return False
+
+        local_now = dt_util.as_local(now)
+        backoff = dict(self.scheduler.backoff)
+        failed_kinds = frozenset().union(*(user.errors.keys() for user in users))
+        # A user without previous fingerprints is new, it does not tell whether
+        # the data changes
+        changed_kinds = frozenset().union(
+            *(changed for user_id, changed in changes.items() if user_id in known_user_ids)
+        )
+        for kind in kinds:
+            if kind in failed_kinds:
+                # A failure tells nothing about the changes, retry at the usual pace
+                self._next_refresh[kind] = now + self.intervals[kind]
+                continue
+            self.scheduler.record(kind, kind in changed_kinds, local_now)
+            self._next_refresh[kind] = now + self.scheduler.interval(kind, local_now)
+        self.update_interval = max(
+            MIN_TICK, min(self._next_refresh.values()) - now
+        )
+        return self.scheduler.backoff != backoff
 
     async def _async_update_data(self):
         """Update data via library."""
+        async with self._refresh_lock:
+            try:
+                return await self._async_update_due_data()
+            finally:
+                self._async_notify_refresh_listeners()
+
+    async def _async_update_due_data(self):
+        """Fetch the kinds of data that are due and merge them with the current data"""
+        now = dt_util.utcnow()
+        kinds = self._due_kinds(now)
+        previous = self.data or {}
+        self.new_messages = {}
+        if not kinds and previous and not any(user.errors for user in previous.values()):
+            # Nothing is due (e.g. a tick rescheduled by new options)
+            self.changes = {}
+            return self.data
         try:
-            return await self.client.async_get_user_data()
+            users = await self.client.async_get_user_data(
+                kinds=kinds, previous=previous
+            )
         except ApschoolApiClientAuthenticationError as exception:
             raise ConfigEntryAuthFailed(exception) from exception
+        except ApschoolApiClientBudgetExceededError as exception:
+            if self.data is None:
+                raise UpdateFailed(exception) from exception
+            # Keep serving the last data, the kinds stay due for the next tick
+            LOGGER.warning("Refresh skipped, the last data is kept: %s", exception)
+            self.changes = {}
+            return self.data
+        except ApschoolApiClientCommunicationError as exception:
+            if self._failing_since is None:
+                self._failing_since = now
+            if self.data is None or now - self._failing_since >= OUTAGE_TOLERANCE:
+                raise UpdateFailed(exception) from exception
+            # The last known values stay available through a short outage,
+            # the kinds stay due for the next tick
+            LOGGER.warning("Refresh failed, the last data is kept: %s", exception)
+            self.changes = {}
+            return self.data
         except ApschoolApiClientError as exception:
             raise UpdateFailed(exception) from exception
+
+        self._failing_since = None
+
+        known_user_ids = set(self.fingerprints)
+        changes = self._compute_changes(users)
+        backoff_changed = self._schedule(kinds, users, changes, known_user_ids, now)
+        self._async_record_history(kinds, users, now)
+        # Compared with the data as it is now, not as it was before the fetch
+        self._async_detect_new_messages(users, self.data or {})
+        user_ids = {user.user_id for user in users}
+        for user_id in self.fingerprints.keys() - user_ids:
+            del self.fingerprints[user_id]
+
+        if not self.last_update_success:
+            # The entities are unavailable, all of them must be written again
+            changes = {user_id: ALL_DATA for user_id in user_ids}
+        elif (
+            not changes
+            and self.data is not None
+            and user_ids == self.data.keys()
+            # The errors tell which kinds to fetch again, they must be kept
+            and all(user.errors == self.data[user.user_id].errors for user in users)
+        ):
+            LOGGER.debug("Data unchanged since the last poll")
+            self.changes = {}
+            if backoff_changed:
+                # The backoff grows while nothing changes, it must survive a restart
+                self._async_save_snapshot(self.data)
+            return self.data
+
+        if self.data is None or user_ids != self.data.keys():
+            self._async_remove_gone_children(user_ids)
+        self._async_update_child_devices(users, changes)
+
+        self.changes = changes
+        data = {user.user_id: user for user in users}
+        self._async_save_snapshot(data)
+        return data
+
+    def _async_remove_gone_children(self, user_ids: set[int]) -> None:
+        """Remove the devices (and so the entities) of the children that are not linked anymore
+
+        The entities of the new children are added by the platforms, which
+        listen to the updates. The history of the removed children is deleted
+        in the background.
+        """
+        if not user_ids:
+            # More likely a glitch of the API than a family without children
+            return
+        gone_user_ids = {
+            user_id for user_id in (self.data or {}) if user_id not in user_ids
+        }
+        device_registry = dr.async_get(self.hass)
+        for device in dr.async_entries_for_config_entry(
+            device_registry, self.config_entry.entry_id
+        ):
+            for domain, identifier in device.identifiers:
+                if (
+                    domain == DOMAIN
+                    and identifier.startswith(CHILD_DEVICE_PREFIX)
+                    and int(identifier.removeprefix(CHILD_DEVICE_PREFIX)) not in user_ids
+                ):
+                    LOGGER.info("Child %s is not linked anymore, removing it", identifier)
+                    device_registry.async_update_device(
+                        device.id, remove_config_entry_id=self.config_entry.entry_id
+                    )
+                    gone_user_ids.add(int(identifier.removeprefix(CHILD_DEVICE_PREFIX)))
+                    break
+
+        if gone_user_ids:
+            self.config_entry.async_create_background_task(
+                self.hass,
+                async_forget_history(self.hass, gone_user_ids, self.config_entry.entry_id),
+                f"{DOMAIN} forget history {self.config_entry.entry_id}",
+            )
+
+    def _async_update_child_devices(
+        self, users: list[UserData], changes: dict[int, frozenset[str]]
+    ) -> None:
+        """Keep the name and class of the children on their device
+
+        The profile is not stored in the state of the entities, so it only
+        reaches the device registry.
+        """
+        device_registry = dr.async_get(self.hass)
+        for user in users:
+            if DATA_PROFILE not in changes.get(user.user_id, ()):
+                continue
+            device = device_registry.async_get_device(
+                identifiers={(DOMAIN, f"{CHILD_DEVICE_PREFIX}{user.user_id}")}
+            )
+            if device is None:
+                # A new child, its device is created with its entities
+                continue
+            device_registry.async_update_device(
+                device.id,
+                name=f"{user.firstname} {user.lastname}",
+                model=user.school_class,
+            )
+
+    async def async_refresh_users(
+        self,
+        kinds: frozenset[str] = ALL_DATA,
+        user_ids: set[int] | None = None,
+    ) -> None:
+        """Refresh some kinds of data of some users right away (e.g. from a service call)
+
+        A scheduled refresh in progress is waited for first. The responses
+        cached by the client are asked again, even the fresh ones. The next
+        scheduled refreshes only move when all the users are refreshed.
+
+        Args:
+            kinds: the kinds of data to refresh, all of them by default
+            user_ids: the users to refresh, all of them by default
+        """
+        async with self._refresh_lock:
+            try:
+                await self._async_refresh_users(kinds, user_ids)
+            finally:
+                self._async_notify_refresh_listeners()
+
+    async def _async_refresh_users(
+        self, kinds: frozenset[str], user_ids: set[int] | None
+    ) -> None:
+        """Refresh some kinds of data of some users and publish the result"""
+        try:
+            users = await self.client.async_get_user_data(
+                kinds=kinds, previous=self.data, user_ids=user_ids, revalidate=True
+            )
+        except ApschoolApiClientAuthenticationError as exception:
+            self.config_entry.async_start_reauth(self.hass)
+            raise HomeAssistantError(f"Authentication failed: {exception}") from exception
+        except ApschoolApiClientError as exception:
+            raise HomeAssistantError(
+                f"Could not refresh the APSchool data: {exception}"
+            ) from exception
+
+        now = dt_util.utcnow()
+        known_user_ids = set(self.fingerprints)
+        changes = self._compute_changes(users)
+        if user_ids is None:
+            # The refresh of some users only tells about them, the others
+            # keep their schedule
+            self._schedule(kinds, users, changes, known_user_ids, now)
+        self._async_record_history(kinds, users, now)
+        self._async_detect_new_messages(users, self.data or {})
+        data = dict(self.data or {}) if user_ids is not None else {}
+        data.update({user.user_id: user for user in users})
+        if user_ids is None and (self.data is None or data.keys() != self.data.keys()):
+            self._async_remove_gone_children(set(data))
+        for user_id in self.fingerprints.keys() - data.keys():
+            del self.fingerprints[user_id]
+
+        if not self.last_update_success:
+            changes = {user_id: ALL_DATA for user_id in data}
+        self.changes = changes
+        self._async_save_snapshot(data)
+        self.async_set_updated_data(data)
+
+    def _compute_changes(self, users: list[UserData]) -> dict[int, frozenset[str]]:
+        """Compare the users with their last fingerprints and remember the new ones
+
+        Returns:
+            dict: the kinds of data that changed, by user_id
+        """
+        changes = {}
+        for user in users:
+            user_fingerprints = user.fingerprints()
+            previous_fingerprints = self.fingerprints.get(user.user_id, {})
+            changed = frozenset(
+                kind
+                for kind, value in user_fingerprints.items()
+                if previous_fingerprints.get(kind) != value
+            )
+            if changed:
+                changes[user.user_id] = changed
+            self.fingerprints[user.user_id] = user_fingerprints
+        return changes
+
+    def _async_detect_new_messages(
+        self, users: list[UserData], previous: dict[int, UserData]
+    ) -> None:
+        """Find the unread messages that were not unread before and fire their events
+
+        A user without previous data has no new message: everything would be new.
+        """
+        new_messages = {}
+        for user in users:
+            before = previous.get(user.user_id)
+            if before is None or not user.unread_messages:
+                continue
+            seen = {message.id for message in before.unread_messages or ()}
+            new = tuple(
+                message for message in user.unread_messages if message.id not in seen
+            )
+            if new:
+                new_messages[user.user_id] = new
+        self.new_messages = new_messages
+
+        for user_id, messages in new_messages.items():
+            # The messages are sorted newest first, fire the oldest first
+            for message in reversed(messages):
+                self.hass.bus.async_fire(
+                    EVENT_NEW_MESSAGE,
+                    {
+                        "config_entry_id": self.config_entry.entry_id,
+                        "user_id": user_id,
+                        **message_event_data(message),
+                    },
+                )
+
+    def _async_record_history(
+        self, kinds: frozenset[str], users: list[UserData], now: datetime
+    ) -> None:
+        """Append the accounts that were just fetched to the history (in the background)"""
+        if self.history is None or DATA_ACCOUNTS not in kinds:
+            return
+        items_by_user = {
+            user.user_id: self.client.accounts[user.user_id].items
+            for user in users
+            if DATA_ACCOUNTS not in user.errors and user.user_id in self.client.accounts
+        }
+        if not items_by_user:
+            return
+
+        async def _async_record() -> None:
+            try:
+                written = await self.hass.async_add_executor_job(
+                    self.history.record, items_by_user, now
+                )
+            except sqlite3.Error as exception:
+                LOGGER.warning("Could not write the accounts history: %s", exception)
+            else:
+                LOGGER.debug("%s account item(s) added to the history", written)
+
+        self.config_entry.async_create_background_task(
+            self.hass, _async_record(), f"{DOMAIN} history {self.config_entry.entry_id}"
+        )
+
+    def _async_save_snapshot(self, data: dict[int, UserData]) -> None:
+        """Save the data to the disk (delayed, so close saves are merged)"""
+        self._store.async_delay_save(
+            lambda: {
+                "users": [user.to_dict() for user in data.values()],
+                "scheduler": (
+                    self.scheduler.to_dict() if self.scheduler is not None else None
+                ),
+            },
+            STORAGE_SAVE_DELAY,
+        )
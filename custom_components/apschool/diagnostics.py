@@ -0,0 +1,72 @@
+"""Diagnostics support for apschool."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .coordinator import ApschoolDataUpdateCoordinator
+
+TO_REDACT = {
+    CONF_PASSWORD,
+    CONF_USERNAME,
+    "firstname",
+    "lastname",
+    "school_class",
+    "user_id",
+    # Title of the unread messages
+    "titre",
+}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator: ApschoolDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    client = coordinator.client
+    users = coordinator.data or {}
+    metrics = client.metrics.to_dict()
+    # Keyed by user id, listed in the order of the users instead
+    metrics["child_durations"] = [
+        metrics["child_durations"].get(str(user_id)) for user_id in users
+    ]
+
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "update_interval": str(coordinator.update_interval),
+            "intervals": {
+                kind: str(interval) for kind, interval in coordinator.intervals.items()
+            },
+            "adaptive_backoff": (
+                dict(coordinator.scheduler.backoff)
+                if coordinator.scheduler is not None
+                else None
+            ),
+        },
+        "client": {
+            "max_concurrency": client.max_concurrency,
+            "circuit_breakers": {
+                endpoint: circuit_breaker.state
+                for endpoint, circuit_breaker in client.circuit_breakers.items()
+            },
+            "daily_budget": {
+                "limit": client.budget.daily_limit,
+                "remaining": client.budget.remaining,
+            },
+            "metrics": metrics,
+        },
+        "users": async_redact_data(
+            [user.to_dict() for user in users.values()], TO_REDACT
+        ),
+    }
@@ -2,26 +2,95 @@
 
 from __future__ import annotations
 
+from collections.abc import Callable, Iterable
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceInfo, DeviceEntryType
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from .const import ATTRIBUTION, DOMAIN, NAME
+from custom_components.apschool.api.helpers import UserData
+
+from .const import ATTRIBUTION, CHILD_DEVICE_PREFIX, DOMAIN, NAME
 from .coordinator import ApschoolDataUpdateCoordinator
 
 
+def child_device_identifier(user_id: int) -> tuple[str, str]:
+    """Device registry identifier of a child"""
+    return (DOMAIN, f"{CHILD_DEVICE_PREFIX}{user_id}")
+
+
+@callback
+def async_setup_child_entities(
+    entry: ConfigEntry,
+    coordinator: ApschoolDataUpdateCoordinator,
+    async_add_entities: AddEntitiesCallback,
+    child_entities: Callable[[UserData], Iterable[Entity]],
+) -> None:
+    """Add the entities of the children, now and whenever a child appears
+
+    Args:
+        entry: the config entry of the platform
+        coordinator: the coordinator of the entry
+        async_add_entities: the callback of the platform
+        child_entities: builds the entities of a child from its data
+    """
+    known_user_ids: set[int] = set()
+
+    @callback
+    def _async_add_new_children() -> None:
+        """Add the entities of the children that appeared since the last update"""
+        user_ids = (coordinator.data or {}).keys()
+        # The entities of the children that are gone are removed with their device
+        known_user_ids.intersection_update(user_ids)
+        new_user_ids = user_ids - known_user_ids
+        if not new_user_ids:
+            return
+        known_user_ids.update(new_user_ids)
+        async_add_entities(
+            [
+                entity
+                for user_id in new_user_ids
+                for entity in child_entities(coordinator.data[user_id])
+            ]
+        )
+
+    _async_add_new_children()
+    entry.async_on_unload(coordinator.async_add_listener(_async_add_new_children))
+
+
 class ApschoolEntity(CoordinatorEntity):
-    """ApschoolEntity class."""
+    """ApschoolEntity class.
+
+    The entities of a child belong to the device of that child, the other ones
+    to the device of the config entry.
+    """
 
     _attr_attribution = ATTRIBUTION
 
-    def __init__(self, coordinator: ApschoolDataUpdateCoordinator) -> None:
+    def __init__(
+        self,
+        coordinator: ApschoolDataUpdateCoordinator,
+        user_data: UserData | None = None,
+    ) -> None:
         """Initialize."""
         super().__init__(coordinator)
         self._attr_unique_id = coordinator.config_entry.entry_id
-        self._attr_device_info = DeviceInfo(
-            entry_type=DeviceEntryType.SERVICE,
-            identifiers={(DOMAIN, self.unique_id)},
-            name=NAME,
-            # model=VERSION,
-            manufacturer=NAME,
-        )
+        if user_data is None:
+            self._attr_device_info = DeviceInfo(
+                entry_type=DeviceEntryType.SERVICE,
+                identifiers={(DOMAIN, self.unique_id)},
+                name=NAME,
+                # model=VERSION,
+                manufacturer=NAME,
+            )
+        else:
+            self._attr_device_info = DeviceInfo(
+                entry_type=DeviceEntryType.SERVICE,
+                identifiers={child_device_identifier(user_data.user_id)},
+                name=f"{user_data.firstname} {user_data.lastname}",
+                manufacturer=NAME,
+                model=user_data.school_class,
+            )
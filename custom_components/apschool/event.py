@@ -0,0 +1,69 @@
+"""Event platform for apschool."""
+
+from __future__ import annotations
+
+from homeassistant.components.event import EventEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from custom_components.apschool.api.helpers import UserData
+
+from .const import DOMAIN, EVENT_TYPE_NEW_MESSAGE
+from .coordinator import ApschoolDataUpdateCoordinator, message_event_data
+from .entity import ApschoolEntity, async_setup_child_entities
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_devices: AddEntitiesCallback,
+) -> None:
+    """Set up the event platform."""
+    coordinator: ApschoolDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    async_setup_child_entities(
+        entry,
+        coordinator,
+        async_add_devices,
+        lambda user_data: [
+            ApschoolMessageEvent(user_data=user_data, coordinator=coordinator)
+        ],
+    )
+
+
+class ApschoolMessageEvent(ApschoolEntity, EventEntity):
+    """apschool Event class, triggered by each new unread message of a child."""
+
+    _attr_event_types = [EVENT_TYPE_NEW_MESSAGE]
+    _attr_translation_key = EVENT_TYPE_NEW_MESSAGE
+
+    def __init__(
+        self,
+        user_data: UserData,
+        coordinator: ApschoolDataUpdateCoordinator,
+    ) -> None:
+        """Initialize the event class."""
+        super().__init__(coordinator, user_data)
+
+        # The entity is named after its translation_key, next to the name of
+        # the device of the child
+        self.has_entity_name = True
+        self._attr_unique_id = f"{user_data.user_id}_{EVENT_TYPE_NEW_MESSAGE}"
+        self._user_id = user_data.user_id
+
+    @property
+    def icon(self) -> str:
+        """Return the icon of the entity."""
+        return "mdi:email-alert"
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Trigger an event for each new message of our user."""
+        messages = self.coordinator.new_messages.get(self._user_id, ())
+        if not messages:
+            super()._handle_coordinator_update()
+            return
+        # The messages are sorted newest first, trigger the oldest first
+        for message in reversed(messages):
+            self._trigger_event(EVENT_TYPE_NEW_MESSAGE, message_event_data(message))
+            self.async_write_ha_state()
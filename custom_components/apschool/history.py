@@ -0,0 +1,181 @@
+"""Local history of the APSchool accounts."""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from collections.abc import Collection
+from datetime import datetime, timezone
+
+HISTORY_FILE = "apschool_history.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS account_items (
+    user_id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    observed_at TEXT NOT NULL,
+    account_type INTEGER,
+    balance REAL,
+    due_amount REAL,
+    PRIMARY KEY (user_id, account_id, observed_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS account_items_user_date
+    ON account_items (user_id, observed_at);
+"""
+
+# Spending of each account of a user between two dates: the sum of the balance
+# decreases, each row being compared with the previous row of its account
+_SPENDING_QUERY = """
+SELECT account_id,
+       SUM(CASE WHEN delta < 0 THEN -delta ELSE 0 END),
+       SUM(CASE WHEN delta > 0 THEN delta ELSE 0 END)
+FROM (
+    SELECT account_id,
+           observed_at,
+           balance - LAG(balance) OVER (
+               PARTITION BY account_id ORDER BY observed_at
+           ) AS delta
+    FROM account_items
+    WHERE user_id = ? AND observed_at <= ?
+)
+WHERE observed_at >= ?
+GROUP BY account_id
+ORDER BY account_id
+"""
+
+
+def _timestamp(moment: datetime) -> str:
+    """Dates are stored in UTC, so that they sort as text"""
+    return moment.astimezone(timezone.utc).isoformat()
+
+
+class AccountHistory:
+    """AccountHistory class
+
+    Append-only SQLite store of the /comptes items of each child. An item is
+    only written when it differs from the last one stored for its account, so
+    the table holds the changes, not the polls.
+
+    The methods block, they are meant to run in the executor.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        # Last (balance, due amount) stored, by (user_id, account_id)
+        self._last: dict[tuple[int, int], tuple[float | None, float | None]] | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.executescript(_SCHEMA)
+        return self._connection
+
+    def _load_last(self, connection: sqlite3.Connection) -> dict:
+        if self._last is None:
+            self._last = {
+                (user_id, account_id): (balance, due_amount)
+                for user_id, account_id, balance, due_amount in connection.execute(
+                    """
+                    SELECT user_id, account_id, balance, due_amount
+                    FROM account_items AS item
+                    WHERE observed_at = (
+                        SELECT MAX(observed_at) FROM account_items
+                        WHERE user_id = item.user_id AND account_id = item.account_id
+                    )
+                    """
+                )
+            }
+        return self._last
+
+    def record(self, items_by_user: dict[int, list[dict]], observed_at: datetime) -> int:
+        """Append the items that changed since they were last stored
+
+        Args:
+            items_by_user: the /comptes items, by user_id
+            observed_at: when the items were fetched
+
+        Returns:
+            int: the number of rows written
+        """
+        timestamp = _timestamp(observed_at)
+        with self._lock:
+            connection = self._connect()
+            last = self._load_last(connection)
+            rows = []
+            for user_id, items in items_by_user.items():
+                for item in items:
+                    if item.get("id") is None:
+                        continue
+                    key = (user_id, int(item["id"]))
+                    values = (item.get("solde"), item.get("totalAPayer"))
+                    if last.get(key) == values:
+                        continue
+                    rows.append((*key, timestamp, item.get("typeCompte"), *values))
+            if not rows:
+                return 0
+            with connection:
+                connection.executemany(
+                    "INSERT OR IGNORE INTO account_items VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+            for user_id, account_id, _, _, balance, due_amount in rows:
+                last[(user_id, account_id)] = (balance, due_amount)
+            return len(rows)
+
+    def forget(self, user_ids: Collection[int]) -> int:
+        """Delete the rows of some users
+
+        Args:
+            user_ids: the children whose history is deleted
+
+        Returns:
+            int: the number of rows deleted
+        """
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return 0
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                deleted = connection.execute(
+                    "DELETE FROM account_items WHERE user_id IN "
+                    f"({', '.join('?' * len(user_ids))})",
+                    user_ids,
+                ).rowcount
+            if self._last is not None:
+                for key in [key for key in self._last if key[0] in user_ids]:
+                    del self._last[key]
+            return deleted
+
+    def spending(self, user_id: int, start: datetime, end: datetime) -> list[dict]:
+        """Get how much was spent from (and added to) each account of a user
+
+        Args:
+            user_id: the child
+            start: the beginning of the period
+            end: the end of the period
+
+        Returns:
+            list[dict]: the account_id, spent and topped_up amounts of each account
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                _SPENDING_QUERY, (user_id, _timestamp(end), _timestamp(start))
+            )
+            return [
+                {
+                    "account_id": account_id,
+                    "spent": round(spent or 0.0, 2),
+                    "topped_up": round(topped_up or 0.0, 2),
+                }
+                for account_id, spent, topped_up in rows
+            ]
+
+    def close(self) -> None:
+        """Close the database"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+                self._last = None
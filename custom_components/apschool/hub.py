@@ -0,0 +1,187 @@
+"""Clients and connection pools shared by the config entries of an account."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+import aiohttp
+from homeassistant.const import (
+    CONF_PASSWORD,
+    CONF_USERNAME,
+    EVENT_HOMEASSISTANT_CLOSE,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util.ssl import get_default_context
+
+from .api.apschool import ApschoolApiClient
+from .api.resilience import RequestBudget, RetryPolicy, TokenBucket
+from .const import (
+    CONF_MAX_CONCURRENCY,
+    CONF_MAX_RETRIES,
+    CONF_REQUEST_TIMEOUT,
+    DATA_HUBS,
+    DATA_LIMITS,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_REQUEST_TIMEOUT,
+    LOGGER,
+)
+
+# Idle connections are kept open that long (in seconds) between two refreshes
+KEEPALIVE_TIMEOUT = 75
+# The resolved address of the API is kept that long (in seconds)
+DNS_CACHE_TTL = 300
+# Connections kept for the authentication and the link switches, on top of the fetches
+EXTRA_CONNECTIONS = 2
+
+
+@dataclass(slots=True)
+class ApschoolHub:
+    """ApschoolHub class
+
+    One client (and so one token cache and one set of message indexes) and
+    one connection pool for all the config entries of an account.
+    """
+
+    client: ApschoolApiClient
+    session: aiohttp.ClientSession
+    entry_ids: set[str] = field(default_factory=set)
+    remove_close_listener: CALLBACK_TYPE | None = None
+
+
+@dataclass(slots=True)
+class AccountLimits:
+    """AccountLimits class
+
+    Rate limiter and daily budget of an account. They outlive the hub, so
+    that reloading the entries does not reset them.
+    """
+
+    rate_limiter: TokenBucket = field(default_factory=TokenBucket)
+    budget: RequestBudget = field(default_factory=RequestBudget)
+
+
+def _hub_key(base_url: str, username: str) -> tuple[str, str]:
+    return (base_url.rstrip("/"), username.strip().lower())
+
+
+def _create_session(max_concurrency: int) -> aiohttp.ClientSession:
+    """Create a session whose connections to the API are kept alive and reused"""
+    connector = aiohttp.TCPConnector(
+        limit_per_host=max_concurrency + EXTRA_CONNECTIONS,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        ssl=get_default_context(),
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+def _retry_policy(entry: ConfigEntry) -> RetryPolicy:
+    return RetryPolicy(
+        max_retries=entry.options.get(CONF_MAX_RETRIES, DEFAULT_MAX_RETRIES),
+        read_timeout=entry.options.get(CONF_REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT),
+    )
+
+
+@callback
+def async_acquire_client(hass: HomeAssistant, entry: ConfigEntry) -> ApschoolApiClient:
+    """Get the client of the account of a config entry, creating it for the first entry
+
+    The options of the entry being set up apply to the shared client.
+    """
+    hubs: dict[tuple[str, str], ApschoolHub] = hass.data.setdefault(DATA_HUBS, {})
+    key = _hub_key(entry.data["base_url"], entry.data[CONF_USERNAME])
+    max_concurrency = entry.options.get(CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY)
+
+    hub = hubs.get(key)
+    if hub is None:
+        limits: AccountLimits = hass.data.setdefault(DATA_LIMITS, {}).setdefault(
+            key, AccountLimits()
+        )
+        session = _create_session(max_concurrency)
+        hub = hubs[key] = ApschoolHub(
+            client=ApschoolApiClient(
+                base_url=entry.data["base_url"],
+                username=entry.data[CONF_USERNAME],
+                password=entry.data[CONF_PASSWORD],
+                session=session,
+                max_concurrency=max_concurrency,
+                retry_policy=_retry_policy(entry),
+                rate_limiter=limits.rate_limiter,
+                budget=limits.budget,
+            ),
+            session=session,
+        )
+
+        async def _async_close_session(event: Event) -> None:
+            hub.remove_close_listener = None
+            await hub.session.close()
+
+        hub.remove_close_listener = hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_CLOSE, _async_close_session
+        )
+    else:
+        LOGGER.debug("Sharing the client of %s with entry %s", key, entry.entry_id)
+        # e.g. after a reauthentication, the newest password is the right one
+        hub.client.update_credentials(entry.data[CONF_PASSWORD])
+        async_apply_client_options(hub.client, entry)
+
+    hub.entry_ids.add(entry.entry_id)
+    return hub.client
+
+
+@callback
+def async_apply_client_options(client: ApschoolApiClient, entry: ConfigEntry) -> None:
+    """Apply the options of an entry to a running client
+
+    The size of the connection pool only follows at the next setup.
+    """
+    client.max_concurrency = entry.options.get(
+        CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY
+    )
+    client.retry_policy = _retry_policy(entry)
+
+
+async def async_release_client(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Release the client of a config entry, it is closed with the last entry"""
+    hubs: dict[tuple[str, str], ApschoolHub] = hass.data.get(DATA_HUBS, {})
+    key = _hub_key(entry.data["base_url"], entry.data[CONF_USERNAME])
+    hub = hubs.get(key)
+    if hub is None:
+        return
+
+    hub.entry_ids.discard(entry.entry_id)
+    if hub.entry_ids:
+        return
+
+    del hubs[key]
+    if hub.remove_close_listener is not None:
+        hub.remove_close_listener()
+    await hub.session.close()
+
+
+async def async_validate_credentials(
+    hass: HomeAssistant, base_url: str, username: str, password: str
+) -> None:
+    """Check credentials by authenticating only (no data is fetched)
+
+    The client of the account is used when it is already set up with the same
+    password, otherwise a throwaway client on the shared Home Assistant session.
+    """
+    key = _hub_key(base_url, username)
+    hub = hass.data.get(DATA_HUBS, {}).get(key)
+    if hub is not None and hub.client.has_password(password):
+        client = hub.client
+    else:
+        limits = hass.data.get(DATA_LIMITS, {}).get(key) or AccountLimits()
+        client = ApschoolApiClient(
+            base_url=base_url,
+            username=username,
+            password=password,
+            session=async_get_clientsession(hass),
+            rate_limiter=limits.rate_limiter,
+            budget=limits.budget,
+        )
+    await client.async_validate_credentials()
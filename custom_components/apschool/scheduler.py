@@ -0,0 +1,130 @@
+"""Adaptive refresh intervals for apschool."""
+
+from __future__ import annotations
+
+from datetime import datetime, time, timedelta
+
+from .api.helpers import DATA_ACCOUNTS, DATA_MESSAGES
+
+# Only these kinds adapt, the profile keeps its (long) interval
+ADAPTIVE_KINDS = (DATA_ACCOUNTS, DATA_MESSAGES)
+# An interval is at most that many times its configured value
+MAX_BACKOFF = 8
+# In the hours where changes usually happen, the interval is divided by this
+ACTIVE_SPEEDUP = 2
+# Adapted intervals never go below this
+MIN_INTERVAL = timedelta(minutes=2)
+# Weight kept by the past activity of an hour of the week at each poll in it
+ACTIVITY_DECAY = 0.9
+# An hour of the week is active when its score is above this
+ACTIVITY_THRESHOLD = 0.5
+HOURS_PER_WEEK = 7 * 24
+
+
+def _hour_of_week(moment: datetime) -> int:
+    return moment.weekday() * 24 + moment.hour
+
+
+class AdaptiveScheduler:
+    """AdaptiveScheduler class
+
+    Adapts the refresh interval of each kind of data to what the past polls
+    observed:
+    - every poll that found no change doubles the interval (up to
+      MAX_BACKOFF times the configured one), a change resets it;
+    - each hour of the week keeps a decaying score of the changes seen in it,
+      during the hours that usually see changes the interval is shortened;
+    - during the quiet hours the interval is the longest one, up to the end
+      of the quiet hours.
+
+    The moments are expected in local time.
+    """
+
+    def __init__(
+        self,
+        intervals: dict[str, timedelta],
+        quiet_start: time | None = None,
+        quiet_end: time | None = None,
+    ) -> None:
+        self.intervals = intervals
+        self.quiet_start = quiet_start
+        self.quiet_end = quiet_end
+        self.backoff: dict[str, int] = {kind: 1 for kind in ADAPTIVE_KINDS}
+        self.activity: dict[str, list[float]] = {
+            kind: [0.0] * HOURS_PER_WEEK for kind in ADAPTIVE_KINDS
+        }
+
+    def is_quiet(self, moment: datetime) -> bool:
+        """Tell whether a moment is in the quiet hours"""
+        if self.quiet_start is None or self.quiet_end is None:
+            return False
+        if self.quiet_start == self.quiet_end:
+            return False
+        now = moment.time()
+        if self.quiet_start < self.quiet_end:
+            return self.quiet_start <= now < self.quiet_end
+        # The quiet hours span midnight
+        return now >= self.quiet_start or now < self.quiet_end
+
+    def is_active(self, kind: str, moment: datetime) -> bool:
+        """Tell whether changes of a kind of data usually happen at this hour of the week"""
+        if kind not in self.activity:
+            return False
+        return self.activity[kind][_hour_of_week(moment)] >= ACTIVITY_THRESHOLD
+
+    def _until_quiet_end(self, moment: datetime) -> timedelta:
+        end = datetime.combine(moment.date(), self.quiet_end, moment.tzinfo)
+        if end <= moment:
+            end += timedelta(days=1)
+        return end - moment
+
+    def interval(self, kind: str, moment: datetime) -> timedelta:
+        """Get the refresh interval of a kind of data polled at a moment"""
+        interval = self.intervals[kind]
+        if kind not in self.backoff:
+            return interval
+        if self.is_active(kind, moment):
+            adapted = max(MIN_INTERVAL, min(interval, interval / ACTIVE_SPEEDUP))
+        else:
+            adapted = max(MIN_INTERVAL, interval * self.backoff[kind])
+        if self.is_quiet(moment):
+            # Wait as long as possible, but poll again when the quiet hours end
+            return max(adapted, min(interval * MAX_BACKOFF, self._until_quiet_end(moment)))
+        return adapted
+
+    def record(self, kind: str, changed: bool, moment: datetime) -> None:
+        """Learn from a poll of a kind of data
+
+        Args:
+            kind: the kind of data that was polled
+            changed: whether the data changed since the previous poll
+            moment: when the poll happened
+        """
+        if kind not in self.backoff:
+            return
+        scores = self.activity[kind]
+        hour = _hour_of_week(moment)
+        scores[hour] = scores[hour] * ACTIVITY_DECAY + (1.0 if changed else 0.0)
+        if changed:
+            self.backoff[kind] = 1
+        else:
+            self.backoff[kind] = min(self.backoff[kind] * 2, MAX_BACKOFF)
+
+    def to_dict(self) -> dict:
+        """Output the learned state as a dict (to be stored)"""
+        return {
+            "backoff": dict(self.backoff),
+            "activity": {
+                kind: [round(score, 4) for score in scores]
+                for kind, scores in self.activity.items()
+            },
+        }
+
+    def restore(self, stored: dict) -> None:
+        """Restore the learned state saved by to_dict"""
+        for kind, backoff in stored.get("backoff", {}).items():
+            if kind in self.backoff:
+                self.backoff[kind] = min(max(int(backoff), 1), MAX_BACKOFF)
+        for kind, scores in stored.get("activity", {}).items():
+            if kind in self.activity and len(scores) == HOURS_PER_WEEK:
+                self.activity[kind] = [float(score) for score in scores]
@@ -3,19 +3,31 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any
 
-from homeassistant.components.sensor import SensorEntity, SensorEntityDescription
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import ATTR_ATTRIBUTION, CURRENCY_EURO
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    CURRENCY_EURO,
+    EntityCategory,
+    UnitOfTime,
+)
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from custom_components.apschool.api.helpers import UserData
+from custom_components.apschool.api.helpers import (
+    DATA_ACCOUNTS,
+    DATA_MESSAGES,
+    UserData,
+)
 
-from .const import ATTRIBUTION, DOMAIN, LOGGER
+from .const import DOMAIN, LOGGER
 from .coordinator import ApschoolDataUpdateCoordinator
-from .entity import ApschoolEntity
+from .entity import ApschoolEntity, async_setup_child_entities
 
 
 @dataclass
@@ -24,6 +36,65 @@ class ApschoolSensorDescription(SensorEntityDescription):
 
     # parent_key = name of the UserData field for this sensor. Used to retrieve the native value
     parent_key: str = None
+    # kind = kind of data (see api.helpers) the parent_key belongs to
+    kind: str | None = None
+
+
+# Sensors of each child, the parent_key is the name of the UserData field
+CHILD_SENSORS: tuple[ApschoolSensorDescription, ...] = (
+    ApschoolSensorDescription(
+        key="balance",
+        translation_key="balance",
+        icon="mdi:account-school",
+        parent_key="balance",
+        kind=DATA_ACCOUNTS,
+        device_class=SensorDeviceClass.MONETARY,
+        state_class=SensorStateClass.TOTAL,
+        native_unit_of_measurement=CURRENCY_EURO,
+    ),
+    ApschoolSensorDescription(
+        key="due_amount",
+        translation_key="due_amount",
+        icon="mdi:cash-clock",
+        parent_key="due_amount",
+        kind=DATA_ACCOUNTS,
+        device_class=SensorDeviceClass.MONETARY,
+        state_class=SensorStateClass.TOTAL,
+        native_unit_of_measurement=CURRENCY_EURO,
+    ),
+    ApschoolSensorDescription(
+        key="unread_messages",
+        translation_key="unread_messages",
+        icon="mdi:email",
+        parent_key="unread_count",
+        kind=DATA_MESSAGES,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+)
+
+# Diagnostic sensors, the parent_key is the name of the ApiMetrics field
+DIAGNOSTIC_SENSORS: tuple[ApschoolSensorDescription, ...] = (
+    ApschoolSensorDescription(
+        key="api_requests",
+        name="API requests",
+        icon="mdi:counter",
+        parent_key="total_requests",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+    ApschoolSensorDescription(
+        key="last_refresh_duration",
+        name="Last refresh duration",
+        icon="mdi:timer-outline",
+        parent_key="last_refresh_duration",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        suggested_display_precision=2,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+)
 
 
 async def async_setup_entry(
@@ -33,82 +104,111 @@ async def async_setup_entry(
 ) -> None:
     """Set up the sensor platform."""
     coordinator: ApschoolDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
-
-    async_add_devices(
-        [
+    async_setup_child_entities(
+        entry,
+        coordinator,
+        async_add_devices,
+        lambda user_data: [
             ApschoolSensor(
                 user_data=user_data,
                 coordinator=coordinator,
+                entity_description=entity_description,
             )
-            for user_data in coordinator.data
-        ]
+            for entity_description in CHILD_SENSORS
+        ],
+    )
+    async_add_devices(
+        ApschoolDiagnosticSensor(
+            coordinator=coordinator,
+            entity_description=entity_description,
+        )
+        for entity_description in DIAGNOSTIC_SENSORS
     )
 
 
 class ApschoolSensor(ApschoolEntity, SensorEntity):
-    """apschool Sensor class."""
+    """apschool Sensor class, one metric of a child.
+
+    The state is computed once per coordinator update, and only written when
+    the kind of data it comes from changed.
+    """
+
+    entity_description: ApschoolSensorDescription
 
     def __init__(
         self,
         user_data: UserData,
         coordinator: ApschoolDataUpdateCoordinator,
+        entity_description: ApschoolSensorDescription,
     ) -> None:
         """Initialize the sensor class."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, user_data)
 
         self.has_entity_name = True
-        self._attr_unique_id = user_data.user_id
-        self._user_data = user_data
-        self._attr_native_unit_of_measurement = CURRENCY_EURO
-        self.attrs: dict[str, Any] = None
+        self.entity_description = entity_description
+        # The balance keeps the unique_id of the sensor it comes from
+        self._attr_unique_id = (
+            user_data.user_id
+            if entity_description.key == "balance"
+            else f"{user_data.user_id}_{entity_description.key}"
+        )
+        self._user_id = user_data.user_id
+        self._attr_native_value = None
+        self._update_from_data()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        if (
+            self.coordinator.last_update_success
+            and self.entity_description.kind
+            not in self.coordinator.changes.get(self._user_id, ())
+        ):
+            # Our metric did not change, no need to write the state
+            return
+        self._update_from_data()
+        super()._handle_coordinator_update()
+
+    def _update_from_data(self) -> None:
+        """Compute the state from the coordinator data of our user"""
+        data = self.coordinator.data.get(self._user_id)
+        if data is None:
+            LOGGER.error(
+                "Could not find data of our sensor %s from the coordinator", self._user_id)
+            return
+
+        self._attr_native_value = getattr(data, self.entity_description.parent_key)
+
+
+class ApschoolDiagnosticSensor(ApschoolEntity, SensorEntity):
+    """apschool diagnostic Sensor class, reports the API client metrics.
+
+    The metrics change with every refresh, so the state is written after each
+    of them, not only when the coordinator calls its listeners.
+    """
+
+    entity_description: ApschoolSensorDescription
 
-    @property
-    def icon(self) -> str:
-        """Shows the correct icon for container."""
-        return "mdi:account-school"
+    def __init__(
+        self,
+        coordinator: ApschoolDataUpdateCoordinator,
+        entity_description: ApschoolSensorDescription,
+    ) -> None:
+        """Initialize the sensor class."""
+        super().__init__(coordinator)
 
-    @property
-    def name(self) -> str:
-        # return self.unique_id
-        return f"{self._user_data.firstname} {self._user_data.lastname}"
+        self.has_entity_name = True
+        self.entity_description = entity_description
+        self._attr_unique_id = f"{coordinator.config_entry.entry_id}_{entity_description.key}"
+
+    async def async_added_to_hass(self) -> None:
+        """Write the state after every refresh, even when the data did not change."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self.coordinator.async_add_refresh_listener(self.async_write_ha_state)
+        )
 
     @property
     def native_value(self):
         """Return the state of the sensor."""
-        return self._determine_native_value()
-
-    @property
-    def extra_state_attributes(self) -> dict[str, Any]:
-        """Return the state attributes."""
-
-        # Get the coordinator data for our sensor id
-        for data in self.coordinator.data:
-            if data.user_id == self._user_data.user_id:
-                self.attrs = {
-                    ATTR_ATTRIBUTION: ATTRIBUTION,
-                    "firstname": data.firstname,
-                    "lastname": data.lastname,
-                    "school_class": data.school_class,
-                    "balance": data.balance,
-                    "unread_messages": (
-                        len(data.unread_messages) if data.unread_messages is not None else 0
-                    ),
-                    "due_amount": data.due_amount,
-                }
-                return self.attrs
-
-        LOGGER.error(
-            "extra_state_attributes - Could not find data of our sensor %s from the coordinator", self._user_data.user_id)
-        return None
-
-    def _determine_native_value(self):
-        """Determine native value."""
-        # Get the coordinator data for our sensor id
-        for user in self.coordinator.data:
-            if user.user_id == self._user_data.user_id:
-                return user.balance
-
-        LOGGER.error(
-            "determine_native_value - Could not find data of our sensor %s from the coordinator", self._user_data.user_id)
-
-        return 0
+        return getattr(self.coordinator.client.metrics, self.entity_description.parent_key)
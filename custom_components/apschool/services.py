@@ -0,0 +1,124 @@
+"""Services for apschool."""
+
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from datetime import timedelta
+
+import homeassistant.helpers.config_validation as cv
+import voluptuous as vol
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from homeassistant.util import dt as dt_util
+
+from .api.helpers import ALL_DATA
+from .const import (
+    ATTR_END,
+    ATTR_KIND,
+    ATTR_START,
+    ATTR_USER_ID,
+    DATA_HISTORY,
+    DOMAIN,
+    SERVICE_GET_SPENDING,
+    SERVICE_REFRESH,
+)
+from .coordinator import ApschoolDataUpdateCoordinator
+
+# Period of the spending when no start is given
+DEFAULT_SPENDING_PERIOD = timedelta(days=30)
+
+REFRESH_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_USER_ID): vol.Coerce(int),
+        vol.Optional(ATTR_KIND): vol.In(sorted(ALL_DATA)),
+    }
+)
+
+GET_SPENDING_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_USER_ID): vol.Coerce(int),
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+    }
+)
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the services of the integration (once for all the entries)."""
+    if hass.services.has_service(DOMAIN, SERVICE_REFRESH):
+        return
+
+    async def _async_handle_refresh(call: ServiceCall) -> None:
+        """Refresh the data of one or all the users right away."""
+        user_id = call.data.get(ATTR_USER_ID)
+        kinds = frozenset((call.data[ATTR_KIND],)) if ATTR_KIND in call.data else ALL_DATA
+
+        coordinators: list[ApschoolDataUpdateCoordinator] = list(
+            hass.data.get(DOMAIN, {}).values()
+        )
+        if user_id is not None:
+            coordinators = [
+                coordinator
+                for coordinator in coordinators
+                if coordinator.data and user_id in coordinator.data
+            ]
+            if not coordinators:
+                raise ServiceValidationError(f"Unknown APSchool user_id: {user_id}")
+
+        await asyncio.gather(
+            *(
+                coordinator.async_refresh_users(
+                    kinds=kinds, user_ids=None if user_id is None else {user_id}
+                )
+                for coordinator in coordinators
+            )
+        )
+
+    async def _async_handle_get_spending(call: ServiceCall) -> ServiceResponse:
+        """Sum up the spending of a user over a period, from the accounts history."""
+        user_id = call.data[ATTR_USER_ID]
+        if not any(
+            coordinator.data and user_id in coordinator.data
+            for coordinator in hass.data.get(DOMAIN, {}).values()
+        ):
+            raise ServiceValidationError(f"Unknown APSchool user_id: {user_id}")
+
+        end = dt_util.as_utc(call.data.get(ATTR_END) or dt_util.utcnow())
+        start = dt_util.as_utc(call.data.get(ATTR_START) or end - DEFAULT_SPENDING_PERIOD)
+        if start > end:
+            raise ServiceValidationError("The start must be before the end")
+
+        try:
+            accounts = await hass.async_add_executor_job(
+                hass.data[DATA_HISTORY].spending, user_id, start, end
+            )
+        except sqlite3.Error as exception:
+            raise HomeAssistantError(
+                f"Could not read the accounts history: {exception}"
+            ) from exception
+
+        return {
+            "user_id": user_id,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "spent": round(sum(account["spent"] for account in accounts), 2),
+            "topped_up": round(sum(account["topped_up"] for account in accounts), 2),
+            "accounts": accounts,
+        }
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_REFRESH, _async_handle_refresh, schema=REFRESH_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_SPENDING,
+        _async_handle_get_spending,
+        schema=GET_SPENDING_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
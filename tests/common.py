@@ -0,0 +1,91 @@
+"""Helpers of the tests that run Home Assistant."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from benchmarks.mock_server import MockApschoolServer
+from custom_components.apschool.api.resilience import TokenBucket
+from custom_components.apschool.const import (
+    CONF_MAX_RETRIES,
+    DATA_LIMITS,
+    DOMAIN,
+)
+from custom_components.apschool.hub import AccountLimits, _hub_key
+from custom_components.apschool.sensor import DIAGNOSTIC_SENSORS
+
+USERNAME = "parent"
+PASSWORD = "secret"
+
+
+@contextlib.asynccontextmanager
+async def setup_mock_entry(
+    hass: HomeAssistant,
+    server: MockApschoolServer,
+    options: dict | None = None,
+    diagnostics: bool = False,
+    entry_id: str | None = None,
+    loaded: bool = True,
+):
+    """Start the mock API and set up a config entry of it
+
+    The account is not rate limited and the failed requests are not retried,
+    so the tests do not wait. The diagnostic sensors (disabled by default) are
+    enabled with `diagnostics`. The setup is expected to succeed, unless
+    `loaded` is False.
+    """
+    base_url = await server.start()
+    hass.data.setdefault(DATA_LIMITS, {})[_hub_key(base_url, USERNAME)] = AccountLimits(
+        rate_limiter=TokenBucket(rate=1000.0, capacity=1000)
+    )
+    entry = MockConfigEntry(
+        entry_id=entry_id,
+        domain=DOMAIN,
+        title=USERNAME,
+        data={"base_url": base_url, CONF_USERNAME: USERNAME, CONF_PASSWORD: PASSWORD},
+        options={CONF_MAX_RETRIES: 0, **(options or {})},
+    )
+    entry.add_to_hass(hass)
+    if diagnostics:
+        for description in DIAGNOSTIC_SENSORS:
+            er.async_get(hass).async_get_or_create(
+                "sensor",
+                DOMAIN,
+                f"{entry.entry_id}_{description.key}",
+                config_entry=entry,
+            )
+    try:
+        assert await hass.config_entries.async_setup(entry.entry_id) is loaded
+        await hass.async_block_till_done()
+        yield entry
+    finally:
+        # The test may have removed the entry
+        if hass.config_entries.async_get_entry(entry.entry_id) is not None:
+            await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_block_till_done()
+        await server.stop()
+
+
+async def wait_for_request(server: MockApschoolServer, name: str) -> None:
+    """Wait until the mock API received a request of an endpoint"""
+    while not server.requests.get(name):
+        await asyncio.sleep(0.001)
+
+
+def unread_message(message_id: int, date: str) -> dict:
+    """/messages item of an unread message"""
+    return {
+        "id": message_id,
+        "titre": f"Message {message_id}",
+        "ouvert": False,
+        "archive": False,
+        "typeMessage": 4,
+        "pieceJointes": False,
+        "dateCreation": date,
+    }
@@ -0,0 +1,44 @@
+"""Fixtures of the apschool tests."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+TEST_FILES = Path(__file__).resolve().parent / "test_files"
+
+# The api package and history.py do not depend on Home Assistant: they are
+# imported on their own, as "api" (like scripts/poll does) and "history", next
+# to the benchmarks mock
+for path in (ROOT, ROOT / "custom_components" / "apschool"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture
+def load_fixture():
+    """Load a JSON file of tests/test_files"""
+
+    def _load(name: str):
+        return json.loads((TEST_FILES / name).read_text(encoding="utf-8"))
+
+    return _load
+
+
+@pytest.fixture
+def local_sockets(request):
+    """Let a test open local sockets, also when pytest-socket blocks them
+
+    pytest-socket comes with the Home Assistant test plugin.
+    """
+    if request.config.pluginmanager.hasplugin("socket"):
+        request.getfixturevalue("socket_enabled")
+
+
+@pytest.fixture
+def config_dir(hass, tmp_path):
+    """Keep the files of Home Assistant (e.g. the accounts history) in tmp_path"""
+    hass.config.config_dir = str(tmp_path)
+    return tmp_path
@@ -0,0 +1,257 @@
+"""Tests of the API client, against the mock API of the benchmarks."""
+
+import asyncio
+import contextlib
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from api import apschool
+from api.apschool import (
+    ApschoolApiClient,
+    ApschoolApiClientBudgetExceededError,
+)
+from api.helpers import DATA_MESSAGES, DATA_PROFILE
+from api.resilience import RequestBudget, RetryPolicy, TokenBucket
+from benchmarks.mock_server import MockApschoolServer
+
+MESSAGES = frozenset((DATA_MESSAGES,))
+
+# The mock API listens on a local port
+pytestmark = pytest.mark.usefixtures("local_sockets")
+
+
+@contextlib.asynccontextmanager
+async def mock_client(server: MockApschoolServer, **kwargs):
+    """Start the mock API and give a client of it (without real-life delays)"""
+    kwargs.setdefault("retry_policy", RetryPolicy(backoff_factor=0.001))
+    kwargs.setdefault("rate_limiter", TokenBucket(rate=1000.0, capacity=1000))
+    base_url = await server.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            yield ApschoolApiClient(
+                username="parent",
+                password="secret",
+                base_url=base_url,
+                session=session,
+                **kwargs,
+            )
+    finally:
+        await server.stop()
+
+
+def unread_ids(users) -> list[int]:
+    """Ids of the unread messages of the only child"""
+    (user,) = users
+    return [message.id for message in user.unread_messages or ()]
+
+
+def test_children_are_fetched():
+    server = MockApschoolServer(children=3, messages=10, latency=0)
+
+    async def scenario():
+        async with mock_client(server) as client:
+            return await client.async_get_user_data()
+
+    users = asyncio.run(scenario())
+
+    assert sorted(user.user_id for user in users) == server.user_ids
+    for user in users:
+        assert user.firstname == f"Child {user.user_id}"
+        assert user.balance == 23.86
+        assert user.due_amount == 15.5
+        assert user.errors == {}
+
+
+def test_tokens_and_responses_are_reused():
+    server = MockApschoolServer(children=2, messages=10, latency=0)
+
+    async def scenario():
+        async with mock_client(server) as client:
+            users = await client.async_get_user_data()
+            server.reset_counters()
+            again = await client.async_get_user_data()
+            return users, again
+
+    users, again = asyncio.run(scenario())
+
+    # No authentication nor link switch, and only 304 responses
+    assert set(server.requests) == {"session", "comptes", "messages"}
+    assert server.response_bytes == 0
+    assert again == users
+
+
+def test_forced_refresh_revalidates_the_fresh_responses():
+    server = MockApschoolServer(children=2, messages=10, latency=0, etags=False)
+
+    async def scenario():
+        async with mock_client(server) as client:
+            await client.async_get_user_data()
+            server.reset_counters()
+            await client.async_get_user_data()
+            cached_requests = server.total_requests
+            users = await client.async_get_user_data(revalidate=True)
+            return cached_requests, users
+
+    cached_requests, users = asyncio.run(scenario())
+
+    assert cached_requests == 0
+    assert server.requests == {"session": 2, "comptes": 2, "messages": 2}
+    assert {user.firstname for user in users} == {
+        f"Child {user_id}" for user_id in server.user_ids
+    }
+
+
+def test_new_message(load_fixture):
+    server = MockApschoolServer(children=1, latency=0)
+    (user_id,) = server.user_ids
+    server.mailboxes[user_id] = load_fixture("messages_with_2_unread.json")["items"]
+
+    async def scenario():
+        async with mock_client(server) as client:
+            users = await client.async_get_user_data()
+            first = unread_ids(users)
+            server.mailboxes[user_id].insert(
+                0,
+                {
+                    "id": 1310000,
+                    "titre": "Nouveau",
+                    "ouvert": False,
+                    "dateCreation": "2024-04-26T08:00:00",
+                },
+            )
+            users = await client.async_get_user_data(
+                kinds=MESSAGES, previous={user.user_id: user for user in users}
+            )
+            return first, unread_ids(users), client._message_indexes[user_id]
+
+    first, second, index = asyncio.run(scenario())
+
+    assert first == [1307847, 1253297]
+    assert second == [1310000, 1307847, 1253297]
+    # The new message was found without a full sync
+    assert index.syncs_since_full == 1
+    assert index.total_items == 4
+
+
+def test_deleted_message_forces_a_full_sync(load_fixture):
+    server = MockApschoolServer(children=1, latency=0)
+    (user_id,) = server.user_ids
+    server.mailboxes[user_id] = load_fixture("messages_with_2_unread.json")["items"]
+
+    async def scenario():
+        async with mock_client(server) as client:
+            users = await client.async_get_user_data()
+            # The oldest unread message is deleted
+            del server.mailboxes[user_id][2]
+            users = await client.async_get_user_data(
+                kinds=MESSAGES, previous={user.user_id: user for user in users}
+            )
+            return unread_ids(users), client._message_indexes[user_id]
+
+    unread, index = asyncio.run(scenario())
+
+    assert unread == [1307847]
+    assert index.syncs_since_full == 0
+    assert index.total_items == 2
+
+
+def test_old_message_opened_is_caught_by_the_full_sync(load_fixture, monkeypatch):
+    # The oldest message is on the second page, which the incremental syncs skip
+    monkeypatch.setattr(apschool, "MESSAGES_PAGE_SIZE", 2)
+    monkeypatch.setattr(apschool, "MESSAGES_FULL_SYNC_EVERY", 1)
+    server = MockApschoolServer(children=1, latency=0)
+    (user_id,) = server.user_ids
+    server.mailboxes[user_id] = load_fixture("messages_with_2_unread.json")["items"]
+
+    async def scenario():
+        async with mock_client(server) as client:
+            users = await client.async_get_user_data()
+            server.mailboxes[user_id][2] = {**server.mailboxes[user_id][2], "ouvert": True}
+            unread = []
+            for _ in range(2):
+                users = await client.async_get_user_data(
+                    kinds=MESSAGES, previous={user.user_id: user for user in users}
+                )
+                unread.append(unread_ids(users))
+            return unread
+
+    incremental, full = asyncio.run(scenario())
+
+    assert incremental == [1307847, 1253297]
+    assert full == [1307847]
+
+
+class CheckedLinkServer(MockApschoolServer):
+    """Mock API that counts the link switches sent without a bearer token"""
+
+    anonymous_links = 0
+
+    async def _change_link(self, request: web.Request) -> web.Response:
+        if "Authorization" not in request.headers:
+            self.anonymous_links += 1
+        return await super()._change_link(request)
+
+
+def test_link_switches_carry_the_account_token_during_a_reauthentication():
+    server = CheckedLinkServer(children=4, messages=10, latency=0.01)
+
+    async def scenario():
+        async with mock_client(server, max_concurrency=1) as client:
+            await client.async_validate_credentials()
+            # e.g. the config flow checking the credentials on the shared client
+            await asyncio.gather(
+                client.async_get_user_data(),
+                client.async_validate_credentials(),
+                client.async_validate_credentials(),
+            )
+
+    asyncio.run(scenario())
+
+    assert server.requests["liaisons"] == 4
+    assert server.anonymous_links == 0
+
+
+class FailingSessionServer(MockApschoolServer):
+    """Mock API whose /session always answers 503"""
+
+    async def _session(self, request: web.Request) -> web.Response:
+        self.requests["session"] = self.requests.get("session", 0) + 1
+        return web.json_response({"message": "mock error"}, status=503)
+
+
+def test_partial_outage_opens_the_circuit_of_its_endpoint():
+    server = FailingSessionServer(children=3, messages=10, latency=0)
+
+    async def scenario():
+        async with mock_client(server) as client:
+            previous = None
+            session_requests = []
+            for _ in range(4):
+                users = await client.async_get_user_data(previous=previous)
+                previous = {user.user_id: user for user in users}
+                session_requests.append(server.requests["session"])
+            return users, session_requests, client
+
+    users, session_requests, client = asyncio.run(scenario())
+
+    assert client.circuit_breakers["GET /session"].state == "open"
+    assert client.circuit_breakers["GET /mediatr-utilisateurs/{id}/comptes"].state == "closed"
+    # No more request to the broken endpoint once its circuit is open
+    assert session_requests[2] == session_requests[3] == session_requests[1]
+    for user in users:
+        assert set(user.errors) == {DATA_PROFILE}
+        assert user.balance == 23.86
+
+
+def test_spent_budget_sends_nothing():
+    server = MockApschoolServer(children=1, messages=10, latency=0)
+
+    async def scenario():
+        async with mock_client(server, budget=RequestBudget(daily_limit=0)) as client:
+            await client.async_get_user_data()
+
+    with pytest.raises(ApschoolApiClientBudgetExceededError):
+        asyncio.run(scenario())
+    assert server.total_requests == 0
@@ -0,0 +1,75 @@
+"""Tests of the HTTP response cache."""
+
+import time
+
+from api.cache import ResponseCache
+
+URL = "https://api.example/session"
+
+
+def test_key_tells_the_children_apart():
+    assert ResponseCache.key(1, URL) != ResponseCache.key(2, URL)
+
+
+def test_key_ignores_the_order_of_the_params():
+    assert ResponseCache.key(1, URL, {"page": 1, "taille": 100}) == ResponseCache.key(
+        1, URL, {"taille": "100", "page": "1"}
+    )
+    assert ResponseCache.key(1, URL, {"page": 1}) != ResponseCache.key(1, URL, {"page": 2})
+
+
+def test_response_with_validators_is_kept():
+    cache = ResponseCache(ttl=0)
+    key = ResponseCache.key(1, URL)
+    cache.set(key, {"prenom": "John"}, etag='"abc"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+
+    cached = cache.get(key)
+    assert cached.value == {"prenom": "John"}
+    assert not cached.is_fresh()
+    assert cached.conditional_headers() == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT",
+    }
+
+
+def test_response_without_validators_expires(monkeypatch):
+    cache = ResponseCache(ttl=30)
+    key = ResponseCache.key(1, URL)
+    cache.set(key, {"prenom": "John"})
+    assert cache.get(key).is_fresh()
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 31)
+    assert cache.get(key) is None
+
+
+def test_response_without_validators_is_not_kept_without_ttl():
+    cache = ResponseCache(ttl=0)
+    key = ResponseCache.key(1, URL)
+    cache.set(key, {"prenom": "John"}, etag='"abc"')
+    cache.set(key, {"prenom": "Jane"})
+
+    # The stale response must not be revalidated either
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_responses_are_dropped():
+    cache = ResponseCache(max_entries=2)
+    keys = [ResponseCache.key(user_id, URL) for user_id in (1, 2, 3)]
+    cache.set(keys[0], 1, etag='"1"')
+    cache.set(keys[1], 2, etag='"2"')
+    cache.get(keys[0])
+    cache.set(keys[2], 3, etag='"3"')
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_invalidate():
+    cache = ResponseCache()
+    key = ResponseCache.key(1, URL)
+    cache.set(key, 1, etag='"1"')
+    cache.invalidate()
+
+    assert cache.get(key) is None
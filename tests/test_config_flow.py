@@ -0,0 +1,81 @@
+"""Tests of the config flow, in Home Assistant."""
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from aiohttp import web  # noqa: E402
+from homeassistant.config_entries import ConfigEntryState  # noqa: E402
+from homeassistant.const import CONF_PASSWORD  # noqa: E402
+from homeassistant.data_entry_flow import FlowResultType  # noqa: E402
+
+from benchmarks.mock_server import MockApschoolServer  # noqa: E402
+from custom_components.apschool.const import DOMAIN  # noqa: E402
+
+from common import PASSWORD, setup_mock_entry  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures(
+    "enable_custom_integrations", "local_sockets", "config_dir"
+)
+
+
+class PasswordServer(MockApschoolServer):
+    """Mock API that only accepts its password"""
+
+    password = PASSWORD
+
+    async def _authenticate(self, request: web.Request) -> web.Response:
+        if (await request.json()).get("motDePasse") != self.password:
+            return web.json_response({"message": "Identifiants invalides"}, status=403)
+        return await super()._authenticate(request)
+
+
+async def async_reauthenticate(hass, entry, *passwords: str) -> list[dict]:
+    """Go through the reauthentication flow of an entry, with each password in turn"""
+    if not hass.config_entries.flow.async_progress_by_handler(DOMAIN):
+        entry.async_start_reauth(hass)
+        await hass.async_block_till_done()
+    (flow,) = hass.config_entries.flow.async_progress_by_handler(DOMAIN)
+    assert flow["step_id"] == "reauth_confirm"
+
+    results = []
+    for password in passwords:
+        results.append(
+            await hass.config_entries.flow.async_configure(
+                flow["flow_id"], {CONF_PASSWORD: password}
+            )
+        )
+    await hass.async_block_till_done()
+    return results
+
+
+async def test_reauthentication(hass):
+    server = PasswordServer(children=1, messages=10, latency=0)
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        server.password = "new secret"
+
+        wrong, right = await async_reauthenticate(hass, entry, "wrong", "new secret")
+
+        assert wrong["type"] == FlowResultType.FORM
+        assert wrong["errors"] == {"base": "auth"}
+        assert right["type"] == FlowResultType.ABORT
+        assert right["reason"] == "reauth_successful"
+        assert entry.data[CONF_PASSWORD] == "new secret"
+        # Reloaded with the new password
+        assert entry.state is ConfigEntryState.LOADED
+        assert hass.data[DOMAIN][entry.entry_id] is not coordinator
+
+
+async def test_refused_credentials_start_a_reauthentication(hass):
+    server = PasswordServer(children=1, messages=10, latency=0)
+    server.password = "new secret"
+
+    async with setup_mock_entry(hass, server, loaded=False) as entry:
+        assert entry.state is ConfigEntryState.SETUP_ERROR
+
+        (result,) = await async_reauthenticate(hass, entry, "new secret")
+
+        assert result["reason"] == "reauth_successful"
+        assert entry.state is ConfigEntryState.LOADED
@@ -0,0 +1,311 @@
+"""Tests of the coordinator, in Home Assistant."""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from aiohttp import web  # noqa: E402
+from homeassistant.const import STATE_UNAVAILABLE  # noqa: E402
+from homeassistant.helpers import device_registry as dr  # noqa: E402
+from homeassistant.helpers import entity_registry as er  # noqa: E402
+from homeassistant.util import dt as dt_util  # noqa: E402
+from pytest_homeassistant_custom_component.common import (  # noqa: E402
+    async_capture_events,
+    async_fire_time_changed,
+)
+
+from benchmarks.mock_server import MockApschoolServer  # noqa: E402
+from custom_components.apschool.api.helpers import UserData  # noqa: E402
+from custom_components.apschool.const import (  # noqa: E402
+    ATTR_KIND,
+    ATTR_USER_ID,
+    CHILD_DEVICE_PREFIX,
+    DATA_HISTORY,
+    DOMAIN,
+    EVENT_NEW_MESSAGE,
+    SERVICE_REFRESH,
+)
+from custom_components.apschool.coordinator import (  # noqa: E402
+    OUTAGE_TOLERANCE,
+    STORAGE_SAVE_DELAY,
+    STORAGE_VERSION,
+)
+
+from common import setup_mock_entry, unread_message, wait_for_request  # noqa: E402
+
+# Long enough for the delayed saves of the snapshot
+STORAGE_DELAY = timedelta(seconds=STORAGE_SAVE_DELAY + 1)
+
+pytestmark = pytest.mark.usefixtures(
+    "enable_custom_integrations", "local_sockets", "config_dir"
+)
+
+
+class SlowSessionServer(MockApschoolServer):
+    """Mock API whose /session answers late, once slow is set"""
+
+    slow = False
+
+    async def _session(self, request: web.Request) -> web.Response:
+        if self.slow:
+            await asyncio.sleep(0.1)
+        return await super()._session(request)
+
+
+async def test_service_refresh_during_a_scheduled_poll(hass):
+    server = SlowSessionServer(children=1, messages=10, latency=0)
+    (user_id,) = server.user_ids
+    events = async_capture_events(hass, EVENT_NEW_MESSAGE)
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        server.mailboxes[user_id].insert(0, unread_message(4000000, "2030-01-01T08:00"))
+        server.slow = True
+        # Every kind is due for the scheduled poll, which waits for /session
+        coordinator._next_refresh.clear()
+
+        scheduled = hass.async_create_task(coordinator.async_refresh())
+        await wait_for_request(server, "session")
+        await hass.services.async_call(
+            DOMAIN, SERVICE_REFRESH, {ATTR_KIND: "messages"}, blocking=True
+        )
+        await scheduled
+        await hass.async_block_till_done()
+
+        messages = coordinator.data[user_id].unread_messages
+
+    # The message is announced once, and it is still in the data
+    assert [event.data["id"] for event in events] == [4000000]
+    assert messages[0].id == 4000000
+
+
+async def test_scheduled_poll_during_a_service_refresh(hass):
+    server = SlowSessionServer(children=1, messages=10, latency=0)
+    (user_id,) = server.user_ids
+    events = async_capture_events(hass, EVENT_NEW_MESSAGE)
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        server.mailboxes[user_id].insert(0, unread_message(4000000, "2030-01-01T08:00"))
+        server.slow = True
+
+        requested = hass.async_create_task(
+            hass.services.async_call(DOMAIN, SERVICE_REFRESH, {}, blocking=True)
+        )
+        await wait_for_request(server, "session")
+        # The scheduled poll starts while the service waits for /session
+        coordinator._next_refresh.clear()
+        await coordinator.async_refresh()
+        await requested
+        await hass.async_block_till_done()
+
+        messages = coordinator.data[user_id].unread_messages
+
+    # The poll compares with the data published by the service
+    assert [event.data["id"] for event in events] == [4000000]
+    assert messages[0].id == 4000000
+
+
+async def test_refresh_of_one_user_keeps_the_schedule(hass):
+    server = MockApschoolServer(children=2, messages=10, latency=0)
+    user_id = server.user_ids[0]
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        next_refresh = dict(coordinator._next_refresh)
+        backoff = dict(coordinator.scheduler.backoff)
+
+        await hass.services.async_call(
+            DOMAIN,
+            SERVICE_REFRESH,
+            {ATTR_USER_ID: user_id, ATTR_KIND: "messages"},
+            blocking=True,
+        )
+        after_one = dict(coordinator._next_refresh), dict(coordinator.scheduler.backoff)
+
+        await hass.services.async_call(
+            DOMAIN, SERVICE_REFRESH, {ATTR_KIND: "messages"}, blocking=True
+        )
+        after_all = dict(coordinator._next_refresh)
+
+    assert after_one == (next_refresh, backoff)
+    assert after_all["messages"] > next_refresh["messages"]
+
+
+async def test_backoff_of_unchanged_polls_is_saved(hass, hass_storage):
+    server = MockApschoolServer(children=1, messages=10, latency=0)
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        key = f"{DOMAIN}.{entry.entry_id}"
+        async_fire_time_changed(hass, dt_util.utcnow() + STORAGE_DELAY)
+        await hass.async_block_till_done()
+        saved = hass_storage[key]["data"]["scheduler"]["backoff"]
+
+        # Every kind is due again, and nothing changed
+        coordinator._next_refresh.clear()
+        await coordinator.async_refresh()
+        async_fire_time_changed(hass, dt_util.utcnow() + STORAGE_DELAY)
+        await hass.async_block_till_done()
+
+        assert hass_storage[key]["data"]["scheduler"]["backoff"] == {
+            kind: backoff * 2 for kind, backoff in saved.items()
+        }
+
+
+async def test_only_the_changed_states_are_written(hass):
+    server = MockApschoolServer(children=2, messages=10, latency=0)
+    user_id, other_user_id = server.user_ids
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        registry = er.async_get(hass)
+        states = {
+            entity.entity_id: hass.states.get(entity.entity_id)
+            for entity in er.async_entries_for_config_entry(registry, entry.entry_id)
+            if not entity.disabled
+        }
+        balance_id = registry.async_get_entity_id("sensor", DOMAIN, user_id)
+
+        # Every kind is due again, nothing changed
+        coordinator._next_refresh.clear()
+        await coordinator.async_refresh()
+        unchanged = coordinator.changes
+
+        # Only the balance of a child changed
+        server.balances[user_id] = 10.0
+        coordinator._next_refresh.clear()
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+        changes = coordinator.changes
+
+        written = {
+            entity_id
+            for entity_id, state in states.items()
+            if hass.states.get(entity_id).last_updated != state.last_updated
+        }
+        balance = hass.states.get(balance_id).state
+
+    assert unchanged == {}
+    assert changes == {user_id: frozenset(("accounts",))}
+    assert written == {balance_id}
+    assert balance == "10.0"
+    assert other_user_id not in changes
+
+
+async def test_last_data_is_kept_through_a_short_outage(hass, freezer):
+    server = MockApschoolServer(children=1, messages=10, latency=0)
+    (user_id,) = server.user_ids
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        balance_id = er.async_get(hass).async_get_entity_id("sensor", DOMAIN, user_id)
+        server.error_rate = 1.0
+
+        freezer.tick(timedelta(hours=1))
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+        during = coordinator.last_update_success, hass.states.get(balance_id).state
+
+        freezer.tick(OUTAGE_TOLERANCE)
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+        after = coordinator.last_update_success, hass.states.get(balance_id).state
+
+    assert during == (True, "23.86")
+    assert after == (False, STATE_UNAVAILABLE)
+
+
+async def test_setup_starts_from_the_snapshot(hass, hass_storage):
+    server = MockApschoolServer(children=1, messages=10, latency=0, error_rate=1.0)
+    (user_id,) = server.user_ids
+    user = UserData(
+        user_id=user_id, firstname="John", lastname="Doe", school_class="C1", balance=5.0
+    )
+    hass_storage[f"{DOMAIN}.snapshot"] = {
+        "version": STORAGE_VERSION,
+        "key": f"{DOMAIN}.snapshot",
+        "data": {"users": [user.to_dict()], "scheduler": None},
+    }
+
+    async with setup_mock_entry(hass, server, entry_id="snapshot") as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        balance_id = er.async_get(hass).async_get_entity_id("sensor", DOMAIN, user_id)
+        state = hass.states.get(balance_id).state
+
+    # The API is down, the entities are set up from the snapshot
+    assert coordinator.data == {user_id: user}
+    assert state == "5.0"
+
+
+async def test_children_are_added_and_removed_live(hass):
+    server = MockApschoolServer(children=1, messages=10, latency=0)
+    (user_id,) = server.user_ids
+    new_user_id = user_id + 1
+
+    async def async_poll_links(coordinator) -> None:
+        # The links are read again when the account token expires
+        coordinator.client._links = None
+        coordinator._next_refresh.clear()
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+
+    def child_ids() -> set[str]:
+        return {
+            identifier
+            for device in dr.async_entries_for_config_entry(device_registry, entry.entry_id)
+            for _, identifier in device.identifiers
+            if identifier.startswith(CHILD_DEVICE_PREFIX)
+        }
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        device_registry = dr.async_get(hass)
+        entity_registry = er.async_get(hass)
+
+        server.user_ids.append(new_user_id)
+        server.mailboxes[new_user_id] = []
+        await async_poll_links(coordinator)
+        added = child_ids()
+        balance_id = entity_registry.async_get_entity_id("sensor", DOMAIN, new_user_id)
+        balance = hass.states.get(balance_id).state
+
+        server.user_ids.remove(user_id)
+        await async_poll_links(coordinator)
+        removed = child_ids()
+        gone_balance_id = entity_registry.async_get_entity_id("sensor", DOMAIN, user_id)
+
+    assert added == {
+        f"{CHILD_DEVICE_PREFIX}{user_id}",
+        f"{CHILD_DEVICE_PREFIX}{new_user_id}",
+    }
+    assert balance == "23.86"
+    assert removed == {f"{CHILD_DEVICE_PREFIX}{new_user_id}"}
+    assert gone_balance_id is None
+
+
+async def test_unlinked_children_lose_their_history(hass):
+    server = MockApschoolServer(children=2, messages=10, latency=0)
+    user_id, other_user_id = server.user_ids
+    start = dt_util.utcnow() - timedelta(days=1)
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        history = hass.data[DATA_HISTORY]
+
+        server.user_ids.remove(user_id)
+        # The links are read again when the account token expires
+        coordinator.client._links = None
+        coordinator._next_refresh.clear()
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+
+        gone = history.spending(user_id, start, dt_util.utcnow())
+        kept = history.spending(other_user_id, start, dt_util.utcnow())
+
+    assert gone == []
+    assert kept != []
+
@@ -0,0 +1,43 @@
+"""Tests of the diagnostics, in Home Assistant."""
+
+import json
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.components.diagnostics import REDACTED  # noqa: E402
+
+from benchmarks.mock_server import MockApschoolServer  # noqa: E402
+from custom_components.apschool.diagnostics import (  # noqa: E402
+    async_get_config_entry_diagnostics,
+)
+
+from common import PASSWORD, USERNAME, setup_mock_entry, unread_message  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures(
+    "enable_custom_integrations", "local_sockets", "config_dir"
+)
+
+
+async def test_personal_data_is_redacted(hass):
+    server = MockApschoolServer(children=2, messages=10, latency=0)
+    user_id, _ = server.user_ids
+    server.mailboxes[user_id].insert(0, unread_message(4000000, "2030-01-01T08:00"))
+
+    async with setup_mock_entry(hass, server) as entry:
+        diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+
+    dump = json.dumps(diagnostics)
+    users = diagnostics["users"]
+    assert len(users) == 2
+    for user in users:
+        for key in ("user_id", "firstname", "lastname", "school_class"):
+            assert user[key] == REDACTED
+    messages = [message for user in users for message in user["unread_messages"] or ()]
+    assert messages
+    assert all(message["titre"] == REDACTED for message in messages)
+    assert len(diagnostics["client"]["metrics"]["child_durations"]) == 2
+    assert diagnostics["entry"]["data"]["password"] == REDACTED
+    for secret in (USERNAME, PASSWORD, str(user_id), "Child "):
+        assert secret not in dump
@@ -0,0 +1,68 @@
+"""Tests of the new message events, in Home Assistant."""
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.components.event import ATTR_EVENT_TYPE  # noqa: E402
+from homeassistant.const import STATE_UNKNOWN  # noqa: E402
+from homeassistant.helpers import entity_registry as er  # noqa: E402
+from pytest_homeassistant_custom_component.common import (  # noqa: E402
+    async_capture_events,
+)
+
+from benchmarks.mock_server import MockApschoolServer  # noqa: E402
+from custom_components.apschool.const import (  # noqa: E402
+    DOMAIN,
+    EVENT_NEW_MESSAGE,
+    EVENT_TYPE_NEW_MESSAGE,
+)
+
+from common import setup_mock_entry, unread_message  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures(
+    "enable_custom_integrations", "local_sockets", "config_dir"
+)
+
+
+async def test_new_messages_fire_events(hass):
+    server = MockApschoolServer(children=2, messages=10, latency=0)
+    user_id, other_user_id = server.user_ids
+    events = async_capture_events(hass, EVENT_NEW_MESSAGE)
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        registry = er.async_get(hass)
+        event_id = registry.async_get_entity_id(
+            "event", DOMAIN, f"{user_id}_{EVENT_TYPE_NEW_MESSAGE}"
+        )
+        other_event_id = registry.async_get_entity_id(
+            "event", DOMAIN, f"{other_user_id}_{EVENT_TYPE_NEW_MESSAGE}"
+        )
+        # The unread messages of the first poll are not new
+        first_events = list(events)
+        initial = hass.states.get(event_id).state
+
+        server.mailboxes[user_id][:0] = [
+            unread_message(4000001, "2030-01-01T09:00"),
+            unread_message(4000000, "2030-01-01T08:00"),
+        ]
+        coordinator._next_refresh.clear()
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+
+        state = hass.states.get(event_id)
+        other_state = hass.states.get(other_event_id)
+
+    assert first_events == []
+    assert initial == STATE_UNKNOWN
+    # Oldest first, on the bus and on the entity of the child
+    assert [(event.data["user_id"], event.data["id"]) for event in events] == [
+        (user_id, 4000000),
+        (user_id, 4000001),
+    ]
+    assert state.attributes[ATTR_EVENT_TYPE] == EVENT_TYPE_NEW_MESSAGE
+    assert state.attributes["id"] == 4000001
+    assert state.attributes["title"] == "Message 4000001"
+    assert state.attributes["friendly_name"].endswith("New message")
+    assert other_state.state == STATE_UNKNOWN
@@ -0,0 +1,95 @@
+"""Tests of the helper classes."""
+
+from api.helpers import (
+    DATA_ACCOUNTS,
+    DATA_MESSAGES,
+    DATA_PROFILE,
+    Accounts,
+    MessageIndex,
+    UnreadMessage,
+    UserData,
+)
+
+
+def test_message_index_keeps_the_unread_messages(load_fixture):
+    index = MessageIndex()
+    index.apply(load_fixture("messages_with_2_unread.json")["items"])
+
+    assert [message.id for message in index.unread_messages()] == [1307847, 1253297]
+    assert index.last_id == 1307847
+    assert index.last_date == "2024-04-25T10:42:08"
+
+
+def test_message_index_without_unread_message(load_fixture):
+    index = MessageIndex()
+    index.apply(load_fixture("messages_with_0_unread.json")["items"])
+
+    assert index.unread_messages() is None
+
+
+def test_message_index_knows_the_older_messages(load_fixture):
+    index = MessageIndex()
+    assert not index.is_known({"id": 1})
+
+    index.apply(load_fixture("messages_with_2_unread.json")["items"])
+
+    assert index.is_known({"id": 1253297})
+    assert index.is_known({"id": None, "dateCreation": "2024-01-01T00:00:00"})
+    assert not index.is_known({"id": 1400000, "dateCreation": "2024-05-01T00:00:00"})
+
+
+def test_message_index_forgets_the_opened_messages(load_fixture):
+    index = MessageIndex()
+    items = load_fixture("messages_with_2_unread.json")["items"]
+    index.apply(items)
+
+    index.apply([{**items[0], "ouvert": True}])
+
+    assert [message.id for message in index.unread_messages()] == [1253297]
+
+
+def test_accounts():
+    accounts = Accounts(
+        {
+            "items": [
+                {"id": 1, "solde": 23.86, "typeCompte": 0, "totalAPayer": 12.5},
+                {"id": 2, "solde": 0.0, "typeCompte": 1, "totalAPayer": 3.0},
+                {"id": 3, "solde": 5.0, "typeCompte": 2},
+            ]
+        }
+    )
+
+    assert accounts.balance == 23.86
+    assert accounts.due_amount == 15.5
+
+
+def test_user_data_round_trip():
+    user = UserData(
+        user_id=1,
+        firstname="John",
+        lastname="Doe",
+        school_class="C1",
+        balance=10.0,
+        unread_messages=(
+            UnreadMessage.from_api(
+                {"id": 5, "titre": "Hello", "dateCreation": "2024-04-25T10:42:08"}
+            ),
+        ),
+        due_amount=2.5,
+        errors={DATA_ACCOUNTS: "Server error 503"},
+    )
+
+    assert UserData.from_json(user.to_json()) == user
+    assert user.unread_count == 1
+
+
+def test_user_data_fingerprints_follow_each_kind():
+    user = UserData(user_id=1, firstname="John", lastname="Doe", school_class="C1", balance=10.0)
+    other = UserData(user_id=1, firstname="John", lastname="Doe", school_class="C2", balance=10.0)
+
+    fingerprints = user.fingerprints()
+    other_fingerprints = other.fingerprints()
+
+    assert fingerprints[DATA_PROFILE] != other_fingerprints[DATA_PROFILE]
+    assert fingerprints[DATA_ACCOUNTS] == other_fingerprints[DATA_ACCOUNTS]
+    assert fingerprints[DATA_MESSAGES] == other_fingerprints[DATA_MESSAGES]
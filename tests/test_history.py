@@ -0,0 +1,85 @@
+"""Tests of the local history of the accounts."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from history import AccountHistory
+
+START = datetime(2024, 4, 1, 8, 0, tzinfo=timezone.utc)
+
+
+def accounts(balance: float, due_amount: float = 0.0) -> list[dict]:
+    """/comptes items of a child"""
+    return [
+        {"id": 1, "solde": balance, "typeCompte": 0, "totalAPayer": due_amount},
+        {"id": 2, "solde": 0.0, "typeCompte": 1, "totalAPayer": 3.0},
+    ]
+
+
+@pytest.fixture
+def history(tmp_path):
+    """History in a temporary database"""
+    history = AccountHistory(str(tmp_path / "history.db"))
+    yield history
+    history.close()
+
+
+def test_only_the_changes_are_stored(history):
+    assert history.record({7: accounts(20.0)}, START) == 2
+    assert history.record({7: accounts(20.0)}, START + timedelta(hours=1)) == 0
+    assert history.record({7: accounts(15.0)}, START + timedelta(hours=2)) == 1
+    assert history.record({7: accounts(15.0, 2.5)}, START + timedelta(hours=3)) == 1
+
+
+def test_spending(history):
+    history.record({7: accounts(20.0), 8: accounts(50.0)}, START)
+    history.record({7: accounts(15.0), 8: accounts(40.0)}, START + timedelta(days=1))
+    history.record({7: accounts(25.0)}, START + timedelta(days=2))
+    history.record({7: accounts(22.5)}, START + timedelta(days=3))
+
+    assert history.spending(7, START, START + timedelta(days=4)) == [
+        {"account_id": 1, "spent": 7.5, "topped_up": 10.0},
+        {"account_id": 2, "spent": 0.0, "topped_up": 0.0},
+    ]
+
+
+def test_spending_compares_with_the_row_before_the_period(history):
+    history.record({7: accounts(20.0)}, START)
+    history.record({7: accounts(15.0)}, START + timedelta(days=1))
+    history.record({7: accounts(10.0)}, START + timedelta(days=2))
+
+    # The first decrease of the period is measured from the row before it
+    assert history.spending(
+        7, START + timedelta(hours=12), START + timedelta(days=1, hours=12)
+    ) == [{"account_id": 1, "spent": 5.0, "topped_up": 0.0}]
+
+
+def test_spending_of_an_unknown_user(history):
+    history.record({7: accounts(20.0)}, START)
+
+    assert history.spending(9, START, START + timedelta(days=1)) == []
+
+
+def test_history_survives_a_reopening(tmp_path):
+    path = str(tmp_path / "history.db")
+    history = AccountHistory(path)
+    history.record({7: accounts(20.0)}, START)
+    history.close()
+
+    history = AccountHistory(path)
+    # The last stored values are read back, an unchanged poll writes nothing
+    assert history.record({7: accounts(20.0)}, START + timedelta(hours=1)) == 0
+    assert history.record({7: accounts(18.0)}, START + timedelta(hours=2)) == 1
+    assert history.spending(7, START, START + timedelta(days=1))[0]["spent"] == 2.0
+    history.close()
+
+
+def test_forget(history):
+    history.record({7: accounts(20.0), 8: accounts(50.0)}, START)
+
+    assert history.forget([7, 9]) == 2
+    assert history.spending(7, START, START + timedelta(days=1)) == []
+    assert history.spending(8, START, START + timedelta(days=1)) != []
+    # The last values of the user are forgotten too, its next poll is stored
+    assert history.record({7: accounts(20.0)}, START + timedelta(hours=1)) == 2
@@ -0,0 +1,101 @@
+"""Tests of the setup of the entries, in Home Assistant."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.const import CONF_PASSWORD  # noqa: E402
+from homeassistant.util import dt as dt_util  # noqa: E402
+from pytest_homeassistant_custom_component.common import (  # noqa: E402
+    async_fire_time_changed,
+)
+
+from benchmarks.mock_server import MockApschoolServer  # noqa: E402
+from custom_components.apschool.const import (  # noqa: E402
+    CONF_ADAPTIVE_POLLING,
+    CONF_MAX_CONCURRENCY,
+    CONF_MESSAGES_INTERVAL,
+    DOMAIN,
+)
+from custom_components.apschool.coordinator import STORAGE_SAVE_DELAY  # noqa: E402
+from custom_components.apschool.history import (  # noqa: E402
+    HISTORY_FILE,
+    AccountHistory,
+)
+
+from common import setup_mock_entry  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures(
+    "enable_custom_integrations", "local_sockets", "config_dir"
+)
+
+
+async def test_options_are_applied_without_a_reload(hass):
+    server = MockApschoolServer(children=1, messages=10, latency=0)
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        hass.config_entries.async_update_entry(
+            entry,
+            options={
+                **entry.options,
+                CONF_MESSAGES_INTERVAL: 30,
+                CONF_ADAPTIVE_POLLING: False,
+                CONF_MAX_CONCURRENCY: 2,
+            },
+        )
+        await hass.async_block_till_done()
+
+        assert hass.data[DOMAIN][entry.entry_id] is coordinator
+        assert coordinator.intervals["messages"] == timedelta(minutes=30)
+        assert coordinator.scheduler is None
+        assert coordinator.update_interval == timedelta(minutes=30)
+        assert coordinator.client.max_concurrency == 2
+
+
+async def test_new_data_reloads_the_entry(hass):
+    server = MockApschoolServer(children=1, messages=10, latency=0)
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        hass.config_entries.async_update_entry(
+            entry, data={**entry.data, CONF_PASSWORD: "new secret"}
+        )
+        await hass.async_block_till_done()
+
+        assert hass.data[DOMAIN][entry.entry_id] is not coordinator
+
+
+def stored_user_ids(path) -> set[int]:
+    """Children with rows in the accounts history"""
+    history = AccountHistory(str(path))
+    try:
+        start = datetime(2000, 1, 1, tzinfo=timezone.utc)
+        return {
+            user_id
+            for user_id in (100000, 100001)
+            if history.spending(user_id, start, dt_util.utcnow())
+        }
+    finally:
+        history.close()
+
+
+async def test_removing_the_entry_deletes_its_history(hass, config_dir):
+    server = MockApschoolServer(children=2, messages=10, latency=0)
+
+    async with setup_mock_entry(hass, server) as entry:
+        # Let the snapshot be saved
+        async_fire_time_changed(
+            hass, dt_util.utcnow() + timedelta(seconds=STORAGE_SAVE_DELAY + 1)
+        )
+        await hass.async_block_till_done()
+        before = stored_user_ids(config_dir / HISTORY_FILE)
+
+        await hass.config_entries.async_remove(entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert before == set(server.user_ids)
+    assert stored_user_ids(config_dir / HISTORY_FILE) == set()
+
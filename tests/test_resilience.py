@@ -0,0 +1,139 @@
+"""Tests of the retry policy, circuit breaker, rate limiter and request budget."""
+
+import asyncio
+import datetime
+import email.utils
+
+import pytest
+
+from api.resilience import (
+    CircuitBreaker,
+    RequestBudget,
+    RetryPolicy,
+    TokenBucket,
+    parse_retry_after,
+)
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-1") == 0.0
+
+
+def test_parse_retry_after_http_date():
+    date = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=30)
+    delay = parse_retry_after(email.utils.format_datetime(date, usegmt=True))
+
+    assert 25 <= delay <= 30
+
+
+def test_parse_retry_after_invalid():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+
+
+def test_retry_delay_is_bounded():
+    policy = RetryPolicy(max_retries=3, backoff_factor=1.0, max_backoff=3.0)
+
+    for attempt in (1, 2, 3):
+        assert 0 <= policy.get_delay(attempt) <= min(3.0, 2 ** (attempt - 1))
+    assert policy.get_delay(4) is None
+
+
+def test_retry_after_is_honoured():
+    policy = RetryPolicy(backoff_factor=0.5, max_backoff=10.0)
+
+    assert 4.0 <= policy.get_delay(1, retry_after=4.0) <= 4.5
+    # Waiting longer than max_backoff is not worth it, the request fails
+    assert policy.get_delay(1, retry_after=60.0) is None
+
+
+def test_timeout_has_a_total_bound():
+    timeout = RetryPolicy(connect_timeout=5.0, read_timeout=10.0).timeout
+
+    assert timeout.sock_connect == 5.0
+    assert timeout.sock_read == 10.0
+    assert timeout.total == 35.0
+    assert RetryPolicy(total_timeout=12.0).timeout.total == 12.0
+
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_time=3600)
+
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_success_resets_the_failures():
+    breaker = CircuitBreaker(failure_threshold=2)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_is_probed_after_the_recovery_time():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=0)
+    breaker.record_failure()
+
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    # A failed probe opens the circuit again, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_token_bucket_burst_then_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=50.0, capacity=2)
+        return [await bucket.async_acquire() for _ in range(3)]
+
+    waits = asyncio.run(scenario())
+
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(1 / 50.0, abs=0.01)
+
+
+def test_token_bucket_serves_the_callers_in_order():
+    async def scenario():
+        bucket = TokenBucket(rate=100.0, capacity=1)
+        order = []
+
+        async def caller(index):
+            await bucket.async_acquire()
+            order.append(index)
+
+        await asyncio.gather(*(caller(index) for index in range(5)))
+        return order
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3, 4]
+
+
+def test_request_budget():
+    budget = RequestBudget(daily_limit=2)
+
+    assert budget.consume()
+    assert budget.consume()
+    assert budget.exhausted
+    assert not budget.consume()
+    assert budget.remaining == 0
+
+
+def test_request_budget_rolls_over_the_next_day():
+    budget = RequestBudget(daily_limit=1)
+    budget.consume()
+    budget.day -= datetime.timedelta(days=1)
+
+    assert budget.remaining == 1
+    assert budget.consume()
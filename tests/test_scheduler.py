@@ -0,0 +1,112 @@
+"""Tests of the adaptive refresh intervals."""
+
+from datetime import datetime, time, timedelta
+
+import pytest
+
+# Importing the integration package loads Home Assistant
+pytest.importorskip("homeassistant")
+
+from custom_components.apschool.api.helpers import (  # noqa: E402
+    DATA_ACCOUNTS,
+    DATA_MESSAGES,
+    DATA_PROFILE,
+)
+from custom_components.apschool.scheduler import (  # noqa: E402
+    MAX_BACKOFF,
+    MIN_INTERVAL,
+    AdaptiveScheduler,
+)
+
+INTERVALS = {
+    DATA_PROFILE: timedelta(hours=12),
+    DATA_ACCOUNTS: timedelta(minutes=30),
+    DATA_MESSAGES: timedelta(minutes=10),
+}
+# A Wednesday, at noon
+NOON = datetime(2024, 4, 24, 12, 0)
+
+
+def test_interval_backs_off_while_nothing_changes():
+    scheduler = AdaptiveScheduler(INTERVALS)
+
+    intervals = []
+    for _ in range(5):
+        scheduler.record(DATA_ACCOUNTS, False, NOON)
+        intervals.append(scheduler.interval(DATA_ACCOUNTS, NOON + timedelta(days=1)))
+
+    assert intervals == [
+        timedelta(minutes=30) * factor for factor in (2, 4, MAX_BACKOFF, MAX_BACKOFF, MAX_BACKOFF)
+    ]
+
+
+def test_change_resets_the_backoff():
+    scheduler = AdaptiveScheduler(INTERVALS)
+    scheduler.record(DATA_ACCOUNTS, False, NOON)
+    scheduler.record(DATA_ACCOUNTS, False, NOON)
+
+    scheduler.record(DATA_ACCOUNTS, True, NOON - timedelta(days=1))
+
+    assert scheduler.interval(DATA_ACCOUNTS, NOON + timedelta(hours=1)) == timedelta(minutes=30)
+
+
+def test_active_hours_are_polled_faster():
+    scheduler = AdaptiveScheduler(INTERVALS)
+    scheduler.record(DATA_MESSAGES, True, NOON)
+
+    # The same hour of the next week
+    assert scheduler.is_active(DATA_MESSAGES, NOON + timedelta(weeks=1, minutes=10))
+    assert scheduler.interval(DATA_MESSAGES, NOON + timedelta(weeks=1)) == max(
+        MIN_INTERVAL, timedelta(minutes=5)
+    )
+    assert not scheduler.is_active(DATA_MESSAGES, NOON + timedelta(hours=1))
+
+
+def test_profile_keeps_its_interval():
+    scheduler = AdaptiveScheduler(INTERVALS)
+    scheduler.record(DATA_PROFILE, False, NOON)
+
+    assert scheduler.interval(DATA_PROFILE, NOON) == timedelta(hours=12)
+
+
+def test_quiet_hours_span_midnight():
+    scheduler = AdaptiveScheduler(INTERVALS, quiet_start=time(22), quiet_end=time(6))
+
+    assert scheduler.is_quiet(datetime(2024, 4, 24, 23, 0))
+    assert scheduler.is_quiet(datetime(2024, 4, 25, 5, 59))
+    assert not scheduler.is_quiet(datetime(2024, 4, 25, 6, 0))
+    assert not scheduler.is_quiet(NOON)
+
+
+def test_quiet_hours_wait_for_their_end():
+    scheduler = AdaptiveScheduler(INTERVALS, quiet_start=time(22), quiet_end=time(6))
+
+    # Until the end of the quiet hours, at most the longest backoff
+    assert scheduler.interval(DATA_MESSAGES, datetime(2024, 4, 25, 5, 0)) == timedelta(hours=1)
+    assert scheduler.interval(DATA_MESSAGES, datetime(2024, 4, 24, 23, 0)) == timedelta(
+        minutes=10
+    ) * MAX_BACKOFF
+
+
+def test_learned_state_round_trip():
+    scheduler = AdaptiveScheduler(INTERVALS)
+    scheduler.record(DATA_ACCOUNTS, False, NOON)
+    scheduler.record(DATA_MESSAGES, True, NOON)
+
+    restored = AdaptiveScheduler(INTERVALS)
+    restored.restore(scheduler.to_dict())
+
+    assert restored.backoff == scheduler.backoff
+    assert restored.is_active(DATA_MESSAGES, NOON)
+    assert restored.interval(DATA_ACCOUNTS, NOON) == scheduler.interval(DATA_ACCOUNTS, NOON)
+
+
+def test_restore_ignores_invalid_values():
+    scheduler = AdaptiveScheduler(INTERVALS)
+    scheduler.restore(
+        {"backoff": {DATA_ACCOUNTS: 1000, "unknown": 2}, "activity": {DATA_MESSAGES: [1.0]}}
+    )
+
+    assert scheduler.backoff[DATA_ACCOUNTS] == MAX_BACKOFF
+    assert "unknown" not in scheduler.backoff
+    assert not scheduler.is_active(DATA_MESSAGES, NOON)
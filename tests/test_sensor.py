@@ -0,0 +1,37 @@
+"""Tests of the sensors, in Home Assistant."""
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.helpers import entity_registry as er  # noqa: E402
+
+from benchmarks.mock_server import MockApschoolServer  # noqa: E402
+from custom_components.apschool.const import DOMAIN  # noqa: E402
+
+from common import setup_mock_entry  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures(
+    "enable_custom_integrations", "local_sockets", "config_dir"
+)
+
+
+async def test_diagnostic_sensors_follow_the_unchanged_polls(hass):
+    server = MockApschoolServer(children=1, messages=10, latency=0)
+
+    async with setup_mock_entry(hass, server, diagnostics=True) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        entity_id = er.async_get(hass).async_get_entity_id(
+            "sensor", DOMAIN, f"{entry.entry_id}_api_requests"
+        )
+        before = int(hass.states.get(entity_id).state)
+
+        # Every kind is due again, and nothing changed
+        coordinator._next_refresh.clear()
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+
+        after = int(hass.states.get(entity_id).state)
+        assert coordinator.changes == {}
+
+    assert before < after == server.total_requests
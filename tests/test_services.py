@@ -0,0 +1,100 @@
+"""Tests of the services, in Home Assistant."""
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.exceptions import ServiceValidationError  # noqa: E402
+
+from benchmarks.mock_server import MockApschoolServer  # noqa: E402
+from custom_components.apschool.const import (  # noqa: E402
+    ATTR_KIND,
+    ATTR_USER_ID,
+    DOMAIN,
+    SERVICE_GET_SPENDING,
+    SERVICE_REFRESH,
+)
+
+from common import setup_mock_entry  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures(
+    "enable_custom_integrations", "local_sockets", "config_dir"
+)
+
+
+async def test_refresh(hass):
+    server = MockApschoolServer(children=2, messages=10, latency=0)
+    user_id, other_user_id = server.user_ids
+
+    async with setup_mock_entry(hass, server) as entry:
+        coordinator = hass.data[DOMAIN][entry.entry_id]
+        server.balances = {user_id: 10.0, other_user_id: 20.0}
+        server.reset_counters()
+
+        await hass.services.async_call(
+            DOMAIN,
+            SERVICE_REFRESH,
+            {ATTR_USER_ID: user_id, ATTR_KIND: "accounts"},
+            blocking=True,
+        )
+        requests = dict(server.requests)
+        balances = {key: user.balance for key, user in coordinator.data.items()}
+
+    # Only the accounts of the child are asked, even if they are still fresh
+    assert requests == {"comptes": 1}
+    assert balances == {user_id: 10.0, other_user_id: 23.86}
+
+
+async def test_refresh_of_an_unknown_user(hass):
+    server = MockApschoolServer(children=1, messages=10, latency=0)
+
+    async with setup_mock_entry(hass, server):
+        with pytest.raises(ServiceValidationError):
+            await hass.services.async_call(
+                DOMAIN, SERVICE_REFRESH, {ATTR_USER_ID: 1}, blocking=True
+            )
+
+
+async def test_get_spending(hass):
+    server = MockApschoolServer(children=1, messages=10, latency=0)
+    (user_id,) = server.user_ids
+
+    async with setup_mock_entry(hass, server):
+        for balance in (20.0, 25.0):
+            server.balances[user_id] = balance
+            await hass.services.async_call(
+                DOMAIN, SERVICE_REFRESH, {ATTR_KIND: "accounts"}, blocking=True
+            )
+            # The history is written in the background
+            await hass.async_block_till_done()
+
+        response = await hass.services.async_call(
+            DOMAIN,
+            SERVICE_GET_SPENDING,
+            {ATTR_USER_ID: user_id},
+            blocking=True,
+            return_response=True,
+        )
+
+    assert response["user_id"] == user_id
+    assert response["spent"] == 3.86
+    assert response["topped_up"] == 5.0
+    assert response["accounts"] == [
+        {"account_id": 1, "spent": 3.86, "topped_up": 5.0},
+        {"account_id": 2, "spent": 0.0, "topped_up": 0.0},
+    ]
+
+
+async def test_get_spending_of_an_unknown_user(hass):
+    server = MockApschoolServer(children=1, messages=10, latency=0)
+
+    async with setup_mock_entry(hass, server):
+        with pytest.raises(ServiceValidationError):
+            await hass.services.async_call(
+                DOMAIN,
+                SERVICE_GET_SPENDING,
+                {ATTR_USER_ID: 1},
+                blocking=True,
+                return_response=True,
+            )
+
@@ -0,0 +1,85 @@
+"""Tests of the incremental parsing of JSON responses."""
+
+import asyncio
+import json
+
+import pytest
+
+from api.streaming import StreamedItems
+
+
+class ChunkedContent:
+    """Stand-in for aiohttp.StreamReader, serving a body in small chunks"""
+
+    def __init__(self, body: bytes, chunk_size: int) -> None:
+        self._body = body
+        self._chunk_size = chunk_size
+
+    async def read(self, size: int = -1) -> bytes:
+        size = min(size, self._chunk_size) if size > 0 else self._chunk_size
+        chunk, self._body = self._body[:size], self._body[size:]
+        return chunk
+
+
+def stream(body: bytes, chunk_size: int = 7, **kwargs) -> tuple[list, StreamedItems]:
+    """Parse a body with StreamedItems"""
+
+    async def scenario():
+        streamed = StreamedItems(ChunkedContent(body, chunk_size), **kwargs)
+        return [item async for item in streamed], streamed
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 16])
+def test_items_match_the_whole_document(load_fixture, chunk_size):
+    document = load_fixture("messages_with_2_unread.json")
+    body = json.dumps(document, ensure_ascii=False, indent=4).encode()
+
+    items, streamed = stream(body, chunk_size)
+
+    assert items == document["items"]
+    assert streamed.others == {"totalItems": 3}
+    assert streamed.size == len(body)
+
+
+def test_only_the_requested_fields_are_kept(load_fixture):
+    document = load_fixture("messages_with_2_unread.json")
+
+    items, _ = stream(json.dumps(document).encode(), fields=("id", "ouvert"))
+
+    assert items == [
+        {"id": item["id"], "ouvert": item["ouvert"]} for item in document["items"]
+    ]
+
+
+def test_empty_items(load_fixture):
+    items, streamed = stream(json.dumps(load_fixture("messages_no_message.json")).encode())
+
+    assert items == []
+    assert streamed.others == {"totalItems": 0}
+
+
+def test_numbers_cut_by_a_chunk_are_complete():
+    body = b'{"totalItems": 1234567, "items": [1234567, 2.5e10]}'
+
+    for chunk_size in range(1, len(body)):
+        items, streamed = stream(body, chunk_size)
+        assert items == [1234567, 2.5e10]
+        assert streamed.others == {"totalItems": 1234567}
+
+
+def test_multibyte_characters_cut_by_a_chunk():
+    items, _ = stream('{"items": [{"titre": "journée"}]}'.encode(), chunk_size=1)
+
+    assert items == [{"titre": "journée"}]
+
+
+def test_truncated_document_fails():
+    with pytest.raises(ValueError):
+        stream(b'{"items": [{"id": 1}, {"id"', chunk_size=4)
+
+
+def test_not_an_object_fails():
+    with pytest.raises(ValueError):
+        stream(b"[1, 2]")
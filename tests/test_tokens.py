@@ -0,0 +1,70 @@
+"""Tests of the bearer token cache."""
+
+import time
+
+from api.tokens import (
+    DEFAULT_TOKEN_LIFETIME,
+    TOKEN_EXPIRY_MARGIN,
+    TokenStore,
+    decode_token_claims,
+)
+from benchmarks.mock_server import make_token
+
+
+def test_decode_token_claims():
+    assert decode_token_claims(make_token("42"))["sub"] == "42"
+
+
+def test_decode_token_claims_of_unreadable_tokens():
+    assert decode_token_claims("not a jwt") == {}
+    assert decode_token_claims("a.!!!.c") == {}
+    assert decode_token_claims(None) == {}
+
+
+def test_token_is_reused_until_its_expiry():
+    store = TokenStore()
+    token = make_token("1", lifetime=3600)
+    store.set((1, 2), token)
+
+    assert store.get((1, 2)) == token
+    assert store.get((2, 3)) is None
+
+
+def test_token_about_to_expire_is_dropped():
+    store = TokenStore()
+    store.set((1, 2), make_token("1", lifetime=TOKEN_EXPIRY_MARGIN - 5))
+
+    assert store.get((1, 2)) is None
+
+
+def test_token_without_expiry_gets_the_default_lifetime(monkeypatch):
+    store = TokenStore()
+    store.set((1, 2), "opaque-token")
+    assert store.get((1, 2)) == "opaque-token"
+
+    now = time.time()
+    monkeypatch.setattr(
+        time, "time", lambda: now + DEFAULT_TOKEN_LIFETIME - TOKEN_EXPIRY_MARGIN + 1
+    )
+    assert store.get((1, 2)) is None
+
+
+def test_empty_token_clears_the_key():
+    store = TokenStore()
+    store.set((1, 2), make_token("1"))
+    store.set((1, 2), None)
+
+    assert store.get((1, 2)) is None
+
+
+def test_invalidate():
+    store = TokenStore()
+    store.set((1, 2), make_token("1"))
+    store.set((3, 4), make_token("3"))
+
+    store.invalidate((1, 2))
+    assert store.get((1, 2)) is None
+    assert store.get((3, 4)) is not None
+
+    store.invalidate()
+    assert store.get((3, 4)) is None